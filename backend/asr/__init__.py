@@ -0,0 +1 @@
+"""asr package for speech recognition helpers used by the speech router."""
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import abc
+import logging
+from typing import Dict, List
+
+import torch
+import whisper
+
+from .decoding import DecodeJob, Segment, decode_batch
+
+logger = logging.getLogger(__name__)
+
+
+class AsrBackend(abc.ABC):
+    """How a Whisper checkpoint is loaded and run for the speech router.
+
+    Backends only differ in the model they hand to :meth:`decode`; decoding
+    itself goes through the shared batched path so transcripts stay directly
+    comparable between backends.
+    """
+
+    name = ""
+    supports_cuda = True
+    # Whether an idle model may be parked in fp16 and cast back (plain float weights only).
+    supports_downcast = True
+
+    def resolve_device(self, device: str) -> str:
+        return device
+
+    @abc.abstractmethod
+    def load(self, model_name: str, device: str):
+        """Load ``model_name`` onto ``device``, ready for :meth:`decode`."""
+
+    def decode(self, model, jobs: List[DecodeJob]) -> List[List[Segment]]:
+        return decode_batch(model, jobs)
+
+
+class ReferenceBackend(AsrBackend):
+    """Stock ``whisper.load_model``: fp16 on CUDA, fp32 on CPU."""
+
+    name = "reference"
+
+    def load(self, model_name: str, device: str):
+        return whisper.load_model(model_name, device=device)
+
+
+class Int8CpuBackend(AsrBackend):
+    """fp32 checkpoint with int8 dynamically quantized Linear layers, CPU only."""
+
+    name = "int8"
+    supports_cuda = False
+    supports_downcast = False
+
+    def resolve_device(self, device: str) -> str:
+        if device != "cpu":
+            logger.warning("WHISPER_BACKEND=int8 runs on the CPU; ignoring device %s", device)
+        return "cpu"
+
+    def load(self, model_name: str, device: str):
+        return quantize_int8(whisper.load_model(model_name, device="cpu"))
+
+
+def quantize_int8(model):
+    """Quantize every Linear layer of the encoder and decoder to int8 weights.
+
+    Whisper uses its own ``Linear`` subclass (it only adds a dtype cast for
+    fp16), and ``quantize_dynamic`` matches module types exactly, so the
+    layers are rebound to ``nn.Linear`` first.  Convolutions, layer norms and
+    the tied token embedding stay in fp32.
+    """
+    model = model.float().eval()
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+BACKENDS: Dict[str, AsrBackend] = {backend.name: backend for backend in (ReferenceBackend(), Int8CpuBackend())}
+
+
+def get_backend(name: str) -> AsrBackend:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown ASR backend {name!r}; expected one of {', '.join(BACKENDS)}") from None
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+# ffmpeg demuxer per accepted upload Content-Type (Opus inside either container).
+CONTAINER_FORMATS = {
+    "audio/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/webm": "matroska",
+}
+# How long the end of a stream may take to come out of ffmpeg.
+FLUSH_TIMEOUT_SECONDS = 3.0
+
+
+def container_for(content_type: str) -> Optional[str]:
+    """ffmpeg input format for a compressed upload, or None for raw PCM."""
+    return CONTAINER_FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+class StreamingAudioDecoder:
+    """Persistent ffmpeg process turning one Ogg/WebM Opus stream into 16 kHz float32.
+
+    The browser's MediaRecorder produces a single container stream cut into
+    chunks (only the first carries the header), so one decoder lives for the
+    whole session and chunks are written to its stdin in arrival order.  A
+    reader task drains stdout continuously; :meth:`decode` never waits for
+    ffmpeg and returns whatever PCM has been decoded so far, so output that
+    is still in flight comes back with the next chunk (or :meth:`flush`).
+    """
+
+    def __init__(self, container: str) -> None:
+        self.container = container
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._output = bytearray()
+        self._lock = asyncio.Lock()
+        self._eof = False
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._output)
+
+    async def _start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-fflags", "nobuffer",
+            "-flags", "low_delay",
+            "-probesize", "32",
+            "-analyzeduration", "0",
+            "-f", self.container,
+            "-i", "pipe:0",
+            "-ac", "1",
+            "-ar", str(SAMPLE_RATE),
+            "-f", "f32le",
+            "pipe:1",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        assert self._process is not None and self._process.stdout is not None
+        try:
+            while True:
+                data = await self._process.stdout.read(16384)
+                if not data:
+                    break
+                self._output.extend(data)
+        finally:
+            self._eof = True
+
+    async def decode(self, data: bytes) -> np.ndarray:
+        async with self._lock:
+            if self._process is None:
+                await self._start()
+            assert self._process is not None and self._process.stdin is not None
+            if self._eof:
+                raise ValueError("Audio decoder has exited; start a new session")
+            try:
+                self._process.stdin.write(data)
+                await self._process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError) as exc:
+                raise ValueError("Audio decoder rejected the stream") from exc
+            # One pass through the loop lets the reader pick up what ffmpeg
+            # already wrote; nothing waits for output that is not there yet.
+            await asyncio.sleep(0)
+            return self._take()
+
+    async def flush(self) -> np.ndarray:
+        """Close the stream and return the remaining decoded audio."""
+        async with self._lock:
+            if self._process is None:
+                return np.zeros(0, dtype=np.float32)
+            if self._process.stdin is not None and not self._process.stdin.is_closing():
+                self._process.stdin.close()
+            if self._reader is not None:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(asyncio.shield(self._reader), FLUSH_TIMEOUT_SECONDS)
+            return self._take()
+
+    def _take(self) -> np.ndarray:
+        usable = len(self._output) - len(self._output) % 4
+        samples = np.frombuffer(bytes(self._output[:usable]), dtype=np.float32).copy()
+        del self._output[:usable]
+        return samples
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._process is not None and self._process.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                self._process.kill()
+        self._process = None
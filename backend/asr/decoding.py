@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import whisper
+from whisper.decoding import DecodingResult, DecodingTask, GreedyDecoder
+from whisper.utils import compression_ratio
+
+from .profiles import PROFILES, DecodeProfile
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+LANGUAGE = "tr"
+# Whisper emits timestamps in 20 ms steps.
+TIME_PRECISION = 1.0 / whisper.audio.TOKENS_PER_SECOND
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+# Above this gzip ratio a decode is treated as a repetition loop (as in whisper.transcribe).
+COMPRESSION_RATIO_THRESHOLD = 2.4
+
+
+@dataclass
+class Segment:
+    start: float
+    end: float
+    text: str
+    # False when the window (or the token cap) ended before its closing timestamp.
+    complete: bool = True
+
+
+@dataclass
+class DecodeJob:
+    audio: np.ndarray
+    prompt: str = ""
+    # Precomputed normalised log-mel input (n_mels x 3000); derived from
+    # ``audio`` when absent.
+    mel: Optional[np.ndarray] = None
+    # Window length in seconds; defaults to the length of ``audio``.
+    duration: Optional[float] = None
+    # Name of the decode profile in ``PROFILES``.
+    profile: str = "streaming"
+    # Timing bookkeeping for metrics (perf_counter seconds); decoding ignores it.
+    submitted_at: float = 0.0
+    queue_seconds: float = 0.0
+    decode_seconds: float = 0.0
+
+    @property
+    def seconds(self) -> float:
+        return self.duration if self.duration is not None else self.audio.size / SAMPLE_RATE
+
+
+def n_mels_for(model_name: str) -> int:
+    """Mel bins a Whisper checkpoint expects, without loading it."""
+    return 128 if "v3" in model_name or model_name.startswith("turbo") else 80
+
+
+def _job_mel(model, job: DecodeJob) -> torch.Tensor:
+    if job.mel is not None and job.mel.shape[0] == model.dims.n_mels:
+        return torch.from_numpy(job.mel).to(model.device)
+    if job.mel is not None and job.audio.size == 0:
+        raise ValueError(f"mel input has {job.mel.shape[0]} bins, model expects {model.dims.n_mels}")
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(job.audio), n_mels=model.dims.n_mels, device=model.device)
+
+
+def segments_from_tokens(tokenizer, tokens: List[int], window_seconds: float) -> List[Segment]:
+    """Split a timestamped token sequence into segments."""
+    segments: List[Segment] = []
+    start: Optional[float] = None
+    text_tokens: List[int] = []
+    for token in tokens:
+        if token < tokenizer.eot:
+            text_tokens.append(token)
+            continue
+        if token < tokenizer.timestamp_begin:
+            continue  # special tokens never belong in the text
+        timestamp = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+        if start is not None and text_tokens:
+            segments.append(Segment(start, timestamp, tokenizer.decode(text_tokens).strip()))
+            start, text_tokens = None, []
+        else:
+            start = timestamp
+    if text_tokens:
+        # Unterminated segment: Whisper is still in the middle of it.
+        segments.append(Segment(start or 0.0, window_seconds, tokenizer.decode(text_tokens).strip(), complete=False))
+    return [seg for seg in segments if seg.text]
+
+
+def _options(profile: DecodeProfile, prompt: str, fp16: bool, temperature: float = 0.0) -> whisper.DecodingOptions:
+    return whisper.DecodingOptions(
+        task="transcribe",
+        language=LANGUAGE,
+        temperature=temperature,
+        sample_len=profile.sample_len,
+        beam_size=profile.beam_size if temperature == 0 else None,
+        best_of=profile.best_of if temperature > 0 else None,
+        without_timestamps=profile.without_timestamps,
+        prompt=prompt or None,
+        fp16=fp16,
+    )
+
+
+def _needs_fallback(result) -> bool:
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD:
+        return False
+    return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+
+def _decode(model, audio_features: torch.Tensor, options: whisper.DecodingOptions) -> list:
+    # whisper.decode repeats the tokens but not the audio features for beam
+    # search and best-of sampling, so those only work one window at a time;
+    # the encoder pass is still shared.
+    if (options.beam_size or options.best_of or 1) > 1 and audio_features.shape[0] > 1:
+        return [whisper.decode(model, audio_features[i : i + 1], options)[0] for i in range(audio_features.shape[0])]
+    return list(whisper.decode(model, audio_features, options))
+
+
+def _decode_group(model, audio_features: torch.Tensor, profile: DecodeProfile, prompt: str, fp16: bool) -> list:
+    results = _decode(model, audio_features, _options(profile, prompt, fp16))
+    for temperature in profile.fallback_temperatures:
+        retry = [i for i, result in enumerate(results) if _needs_fallback(result)]
+        if not retry:
+            break
+        redone = _decode(model, audio_features[retry], _options(profile, prompt, fp16, temperature))
+        for i, result in zip(retry, redone):
+            results[i] = result
+    return results
+
+
+class _PaddedInference:
+    """Whisper's decoder forward pass over left-padded prefixes of different lengths.
+
+    ``whisper.decode`` gives every row of a batch the same prefix, so rows
+    with different prompts could not share a decode.  Here each row keeps
+    its own prefix: padding is masked out of self-attention and positions
+    count from the row's first real token, so a row decodes exactly as it
+    would alone.
+    """
+
+    def __init__(self, model, audio_features: torch.Tensor, valid: torch.Tensor) -> None:
+        self.blocks = list(model.decoder.blocks)
+        self.decoder = model.decoder
+        self.dtype = audio_features.dtype
+        self.valid = valid
+        self.positions = (valid.long().cumsum(-1) - 1).clamp(min=0)
+        self.cross = [
+            (block.cross_attn.key(audio_features), block.cross_attn.value(audio_features)) for block in self.blocks
+        ]
+        self.cache: List[Tuple[torch.Tensor, torch.Tensor]] = []
+
+    @staticmethod
+    def _attend(attn, x: torch.Tensor, k: torch.Tensor, v: torch.Tensor, mask: Optional[torch.Tensor]) -> torch.Tensor:
+        q = attn.query(x)
+        n_batch, n_ctx, _ = q.shape
+        q = q.view(n_batch, n_ctx, attn.n_head, -1).transpose(1, 2)
+        k = k.view(n_batch, k.shape[1], attn.n_head, -1).transpose(1, 2)
+        v = v.view(n_batch, v.shape[1], attn.n_head, -1).transpose(1, 2)
+        out = F.scaled_dot_product_attention(q, k, v, attn_mask=mask)
+        return attn.out(out.transpose(1, 2).flatten(start_dim=2))
+
+    def logits(self, tokens: torch.Tensor) -> torch.Tensor:
+        done = self.cache[0][0].shape[1] if self.cache else 0
+        total = tokens.shape[1]
+        new = tokens[:, done:]
+        if total > self.valid.shape[1]:
+            # Sampled tokens are always real; positions continue from the last one.
+            extra = total - self.valid.shape[1]
+            steps = torch.arange(1, extra + 1, device=tokens.device)
+            self.valid = F.pad(self.valid, (0, extra), value=True)
+            self.positions = torch.cat([self.positions, self.positions[:, -1:] + steps], dim=1)
+        query = torch.arange(done, total, device=tokens.device)
+        key = torch.arange(total, device=tokens.device)
+        # Padding never serves as a key for real tokens; every position may see
+        # itself so fully padded rows stay finite.
+        mask = (self.valid[:, None, :] & (key[None, :] <= query[:, None])[None]) | (key[None, :] == query[:, None])[None]
+        mask = mask[:, None]
+
+        x = self.decoder.token_embedding(new) + self.decoder.positional_embedding[self.positions[:, done:]]
+        x = x.to(self.dtype)
+        for index, block in enumerate(self.blocks):
+            h = block.attn_ln(x)
+            k, v = block.attn.key(h), block.attn.value(h)
+            if len(self.cache) > index:
+                k = torch.cat([self.cache[index][0], k], dim=1)
+                v = torch.cat([self.cache[index][1], v], dim=1)
+                self.cache[index] = (k, v)
+            else:
+                self.cache.append((k, v))
+            x = x + self._attend(block.attn, h, k, v, mask)
+            cross_k, cross_v = self.cross[index]
+            x = x + self._attend(block.cross_attn, block.cross_attn_ln(x), cross_k, cross_v, None)
+            x = x + block.mlp(block.mlp_ln(x))
+        x = self.decoder.ln(x)
+        return (x @ self.decoder.token_embedding.weight.to(x.dtype).T).float()
+
+
+def _decode_prompted(model, audio_features: torch.Tensor, prompts: List[str], profile: DecodeProfile, fp16: bool) -> list:
+    """Greedy decode of one batch in which every row has its own prompt."""
+    tasks = [DecodingTask(model, _options(profile, prompt, fp16)) for prompt in prompts]
+    task = tasks[0]
+    tokenizer = task.tokenizer
+    eot = tokenizer.eot
+    width = max(len(t.initial_tokens) for t in tasks)
+    n_batch = len(tasks)
+
+    tokens = torch.full((n_batch, width), eot, dtype=torch.long, device=audio_features.device)
+    valid = torch.zeros((n_batch, width), dtype=torch.bool, device=audio_features.device)
+    for row, row_task in enumerate(tasks):
+        prefix = torch.tensor(row_task.initial_tokens, device=audio_features.device)
+        tokens[row, width - prefix.numel() :] = prefix
+        valid[row, width - prefix.numel() :] = True
+    # Every prefix ends in the same SOT sequence, so SOT sits in one column.
+    sot_column = width - (len(task.initial_tokens) - task.sot_index)
+    # The filters only look at sampled tokens, which now start after the padded width.
+    for logit_filter in task.logit_filters:
+        if hasattr(logit_filter, "sample_begin"):
+            logit_filter.sample_begin = width
+
+    inference = _PaddedInference(model, audio_features, valid)
+    decoder = GreedyDecoder(0.0, eot)
+    sum_logprobs = torch.zeros(n_batch, device=audio_features.device)
+    no_speech_probs = [float("nan")] * n_batch
+    for step in range(task.sample_len):
+        logits = inference.logits(tokens)
+        if step == 0 and tokenizer.no_speech is not None:
+            no_speech_probs = logits[:, sot_column].softmax(dim=-1)[:, tokenizer.no_speech].tolist()
+        logits = logits[:, -1]
+        for logit_filter in task.logit_filters:
+            logit_filter.apply(logits, tokens)
+        tokens, completed = decoder.update(tokens, logits, sum_logprobs)
+        if completed or tokens.shape[-1] > task.n_ctx:
+            break
+
+    tokens = F.pad(tokens, (0, 1), value=eot)
+    results = []
+    for row in range(n_batch):
+        sampled = tokens[row, width:]
+        sampled = sampled[: (sampled == eot).nonzero()[0, 0]].tolist()
+        text = tokenizer.decode(sampled).strip()
+        results.append(
+            DecodingResult(
+                audio_features=audio_features[row],
+                language=LANGUAGE,
+                tokens=sampled,
+                text=text,
+                avg_logprob=sum_logprobs[row].item() / (len(sampled) + 1),
+                no_speech_prob=no_speech_probs[row],
+                temperature=0.0,
+                compression_ratio=compression_ratio(text),
+            )
+        )
+    return results
+
+
+def _decode_rows(model, audio_features: torch.Tensor, profile: DecodeProfile, prompts: List[str], fp16: bool) -> list:
+    """Greedy profiles: one batched decode whatever the prompts, then per-row fallback."""
+    results = _decode_prompted(model, audio_features, prompts, profile, fp16)
+    for temperature in profile.fallback_temperatures:
+        retry = [i for i, result in enumerate(results) if _needs_fallback(result)]
+        if not retry:
+            break
+        for i in retry:
+            options = _options(profile, prompts[i], fp16, temperature)
+            results[i] = _decode(model, audio_features[i : i + 1], options)[0]
+    return results
+
+
+def decode_batch(model, jobs: List[DecodeJob]) -> List[List[Segment]]:
+    """Decode several windows with one encoder pass and batched decoding per profile."""
+    fp16 = getattr(model, "device", torch.device("cpu")).type == "cuda"
+    mel = torch.stack([_job_mel(model, job) for job in jobs])
+    with torch.no_grad():
+        audio_features = model.encoder(mel.half() if fp16 else mel)
+
+    # Greedy profiles decode each profile's jobs as one batch even though
+    # every session brings its own prompt.  Beam search runs one window at a
+    # time anyway (see _decode), so those jobs only group by prompt; the
+    # expensive encoder pass above is shared by all of them regardless.
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for index, job in enumerate(jobs):
+        shared_prompt = "" if PROFILES[job.profile].beam_size is None else job.prompt
+        groups.setdefault((job.profile, shared_prompt), []).append(index)
+
+    tokenizer = whisper.tokenizer.get_tokenizer(
+        model.is_multilingual, num_languages=model.num_languages, language=LANGUAGE, task="transcribe"
+    )
+    results: List[List[Segment]] = [[] for _ in jobs]
+    for (profile, prompt), indices in groups.items():
+        spec = PROFILES[profile]
+        if spec.beam_size is None:
+            prompts = [jobs[index].prompt for index in indices]
+            decoded = _decode_rows(model, audio_features[indices], spec, prompts, fp16)
+        else:
+            decoded = _decode_group(model, audio_features[indices], spec, prompt, fp16)
+        for index, result in zip(indices, decoded):
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                continue
+            results[index] = segments_from_tokens(tokenizer, result.tokens, jobs[index].seconds)
+    return results
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+import numpy as np
+import whisper
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Whisper's front end: 25 ms Hann windows every 10 ms, 30 s of frames per decode.
+N_FFT = whisper.audio.N_FFT
+HOP_LENGTH = whisper.audio.HOP_LENGTH
+N_FRAMES = whisper.audio.N_FRAMES
+HALF_WINDOW = N_FFT // 2
+# log10 of the clamp Whisper applies to silent (zero-padded) frames.
+SILENT_FRAME = -10.0
+# Smallest frame allocation once audio arrives (about 5 s).
+MIN_FRAMES = 512
+
+_WINDOW = (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def _mel_filters(n_mels: int) -> np.ndarray:
+    return whisper.audio.mel_filters("cpu", n_mels).numpy()
+
+
+def _log_mel_frames(samples: np.ndarray, n_frames: int, n_mels: int) -> np.ndarray:
+    """log10 mel power of ``n_frames`` windows starting every hop in ``samples``."""
+    windows = sliding_window_view(samples, N_FFT)[::HOP_LENGTH][:n_frames] * _WINDOW
+    spectrum = np.fft.rfft(windows, axis=1)
+    power = spectrum.real**2 + spectrum.imag**2
+    mel = _mel_filters(n_mels) @ power.T
+    return np.log10(np.maximum(mel, 1e-10)).astype(np.float32)
+
+
+class LogMelStream:
+    """Rolling log-mel features for a session's audio window.
+
+    Frame ``k`` is centred on sample ``k * HOP_LENGTH`` of the window, exactly
+    as in ``whisper.log_mel_spectrogram``.  Frames whose whole STFT window is
+    available are computed once, as audio arrives, and kept until the window
+    is trimmed from the front (trims must be multiples of ``HOP_LENGTH``).
+    The last couple of frames, which overlap the end of the window, are
+    computed per decode against Whisper's zero padding.  The per-window
+    max-normalisation is applied when the decoder input is assembled.
+
+    Frame storage grows with the window, to at most twice Whisper's 3000
+    frames (1.9 MB at 80 mel bins, 3.1 MB at 128); an idle session holds none.
+    """
+
+    def __init__(self, n_mels: int = 80) -> None:
+        self.n_mels = n_mels
+        # Linear storage with compaction; twice the frames in use keeps moves rare.
+        self._frames = np.empty((n_mels, 0), dtype=np.float32)
+        self._start = 0
+        self._count = 0
+
+    @property
+    def computed(self) -> int:
+        return self._count
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._frames.nbytes
+
+    def clear(self) -> None:
+        self._start = 0
+        self._count = 0
+
+    def drop_front(self, samples: int) -> None:
+        if samples % HOP_LENGTH:
+            raise ValueError("trims must be a multiple of the hop length")
+        frames = min(samples // HOP_LENGTH, self._count)
+        self._start += frames
+        self._count -= frames
+
+    def extend(self, window: np.ndarray) -> None:
+        """Compute the frames that became complete since the last call."""
+        target = min(_complete_frames(window.size), N_FRAMES)
+        if target <= self._count:
+            return
+        samples = _frame_source(window, self._count, target)
+        new = _log_mel_frames(samples, target - self._count, self.n_mels)
+
+        if self._start + target > self._frames.shape[1]:
+            width = self._frames.shape[1]
+            if width < 2 * target and width < 2 * N_FRAMES:
+                grown = np.empty((self.n_mels, min(max(2 * target, MIN_FRAMES), 2 * N_FRAMES)), dtype=np.float32)
+                grown[:, : self._count] = self._frames[:, self._start : self._start + self._count]
+                self._frames = grown
+            else:
+                self._frames[:, : self._count] = self._frames[:, self._start : self._start + self._count]
+            self._start = 0
+        self._frames[:, self._start + self._count : self._start + target] = new
+        self._count = target
+
+    def decoder_input(self, window: np.ndarray) -> np.ndarray:
+        """Normalised ``(n_mels, N_FRAMES)`` log-mel input for ``window``.
+
+        ``window`` must be a prefix of the audio the frames were computed from
+        (e.g. the active buffer minus trailing silence).
+        """
+        out = np.full((self.n_mels, N_FRAMES), SILENT_FRAME, dtype=np.float32)
+        cached = min(self._count, _complete_frames(window.size))
+        out[:, :cached] = self._frames[:, self._start : self._start + cached]
+
+        # Frames that overlap the end of the window see Whisper's zero padding.
+        touched = min(-(-(window.size + HALF_WINDOW) // HOP_LENGTH), N_FRAMES)
+        if touched > cached:
+            samples = _frame_source(window, cached, touched)
+            padding = (touched - cached - 1) * HOP_LENGTH + N_FFT - samples.size
+            if padding > 0:
+                samples = np.concatenate((samples, np.zeros(padding, dtype=np.float32)))
+            out[:, cached:touched] = _log_mel_frames(samples, touched - cached, self.n_mels)
+
+        np.maximum(out, out.max() - 8.0, out=out)
+        out += 4.0
+        out /= 4.0
+        return out
+
+
+def _complete_frames(size: int) -> int:
+    """Number of frames whose STFT window lies entirely inside ``size`` samples."""
+    return max((size - HALF_WINDOW) // HOP_LENGTH + 1, 0)
+
+
+def _frame_source(window: np.ndarray, first: int, stop: int) -> np.ndarray:
+    """Samples backing frames ``first..stop``; reflect-padded at the window start."""
+    begin = first * HOP_LENGTH - HALF_WINDOW
+    end = min((stop - 1) * HOP_LENGTH + HALF_WINDOW, window.size)
+    if begin >= 0:
+        return window[begin:end]
+    return np.pad(window[:end], (-begin, 0), mode="reflect")
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import torch
+
+from ..metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+model_resident_bytes = Gauge(
+    "asr_model_resident_bytes", "Memory held by a managed model's weights (0 when unloaded).", ("model",)
+)
+model_loads = Counter("asr_model_loads_total", "Managed model loads, including reloads after idling.", ("model",))
+model_unloads = Counter(
+    "asr_model_unloads_total", "Managed models unloaded or downcast, by reason.", ("model", "reason")
+)
+
+
+def tensor_bytes(model) -> int:
+    """Bytes of every tensor in the model's state dict (quantized packs included)."""
+    total = 0
+    stack: List[Any] = list(model.state_dict().values())
+    while stack:
+        value = stack.pop()
+        if isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+        elif isinstance(value, (tuple, list)):
+            stack.extend(value)
+    return total
+
+
+class ManagedModel:
+    """One model slot: how to load it, and what is resident right now.
+
+    ``state`` is ``"unloaded"``, ``"loading"``, ``"resident"`` or
+    ``"downcast"`` (fp16 weights parked on the CPU).
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], device: str, can_downcast: bool) -> None:
+        self.name = name
+        self.loader = loader
+        self.device = device
+        self.can_downcast = can_downcast
+        self.model: Any = None
+        self.state = "unloaded"
+        self.resident_bytes = 0
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+
+class ModelManager:
+    """Keeps heavy models within a memory budget and drops them when idle.
+
+    Callers borrow a model with :meth:`use`; borrowed models are never
+    unloaded.  A model idle for ``idle_seconds`` is either unloaded or, with
+    ``idle_action="downcast"``, converted to fp16 on the CPU, which frees the
+    GPU entirely and halves host memory while restoring in a fraction of a
+    full load (Whisper checkpoints are stored in fp16, so the round trip is
+    lossless).  When a load pushes the total over ``budget_bytes``, the least
+    recently used idle models are unloaded first.  :meth:`prefetch` loads in
+    the background so the first decode after a quiet period does not pay for
+    it.
+    """
+
+    def __init__(self, budget_bytes: int = 0, idle_seconds: float = 0.0, idle_action: str = "unload") -> None:
+        if idle_action not in ("unload", "downcast"):
+            raise ValueError("idle_action must be 'unload' or 'downcast'")
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.idle_action = idle_action
+        self._models: Dict[str, ManagedModel] = {}
+
+    def register(self, name: str, loader: Callable[[], Any], device: str, can_downcast: bool = True) -> None:
+        self._models[name] = ManagedModel(name, loader, device, can_downcast)
+        model_resident_bytes.labels(model=name).set(0)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    @contextlib.contextmanager
+    def use(self, name: str) -> Iterator[Any]:
+        """Borrow a model, loading or restoring it first if needed (blocking)."""
+        entry = self._models[name]
+        with entry.lock:
+            self._ensure_resident(entry)
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+        try:
+            yield entry.model
+        finally:
+            with entry.lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def get(self, name: str) -> Any:
+        """Load a model without borrowing it (warm-up)."""
+        with self.use(name) as model:
+            return model
+
+    def prefetch(self, name: str) -> None:
+        """Count activity on ``name`` and bring it back in a background thread if it idled out."""
+        entry = self._models.get(name)
+        if entry is None:
+            return
+        entry.last_used = time.monotonic()
+        if entry.state in ("resident", "loading"):
+            return
+        threading.Thread(target=self._prefetch, args=(entry,), name=f"model-prefetch-{name}", daemon=True).start()
+
+    def _prefetch(self, entry: ManagedModel) -> None:
+        try:
+            with entry.lock:
+                self._ensure_resident(entry)
+        except Exception:
+            logger.exception("background load of %s failed", entry.name)
+
+    def _ensure_resident(self, entry: ManagedModel) -> None:
+        # Caller holds entry.lock.
+        if entry.state == "resident":
+            return
+        started = time.perf_counter()
+        entry.state = "loading"
+        try:
+            if entry.model is not None:
+                entry.model = entry.model.to(entry.device).float()
+                action = "restored"
+            else:
+                entry.model = entry.loader()
+                action = "loaded"
+        except Exception:
+            entry.model = None
+            entry.state = "unloaded"
+            entry.resident_bytes = 0
+            raise
+        entry.state = "resident"
+        entry.resident_bytes = tensor_bytes(entry.model)
+        model_resident_bytes.labels(model=entry.name).set(entry.resident_bytes)
+        model_loads.labels(model=entry.name).inc()
+        logger.info(
+            "model %s %s in %.1fs (%.0f MB)",
+            entry.name,
+            action,
+            time.perf_counter() - started,
+            entry.resident_bytes / 2**20,
+        )
+        self._enforce_budget(keep=entry)
+
+    def _enforce_budget(self, keep: ManagedModel) -> None:
+        if self.budget_bytes <= 0:
+            return
+        others = sorted((e for e in self._models.values() if e is not keep and e.model is not None), key=lambda e: e.last_used)
+        for entry in others:
+            if self.total_bytes <= self.budget_bytes:
+                return
+            # Never block a load on another model's lock; a busy model stays.
+            if entry.lock.acquire(blocking=False):
+                try:
+                    if entry.in_use == 0:
+                        self._release(entry, "unload", "budget")
+                finally:
+                    entry.lock.release()
+        if self.total_bytes > self.budget_bytes:
+            logger.warning(
+                "models use %.0f MB, over the %.0f MB budget", self.total_bytes / 2**20, self.budget_bytes / 2**20
+            )
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        """Unload or downcast every model idle for longer than ``idle_seconds``."""
+        if self.idle_seconds <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        for entry in self._models.values():
+            if entry.state != "resident" or now - entry.last_used < self.idle_seconds:
+                continue
+            if not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                if entry.state == "resident" and entry.in_use == 0:
+                    action = self.idle_action if entry.can_downcast else "unload"
+                    self._release(entry, action, "idle")
+            finally:
+                entry.lock.release()
+
+    def _release(self, entry: ManagedModel, action: str, reason: str) -> None:
+        # Caller holds entry.lock.
+        if action == "downcast":
+            entry.model = entry.model.to("cpu").half()
+            entry.state = "downcast"
+            entry.resident_bytes = tensor_bytes(entry.model)
+        else:
+            entry.model = None
+            entry.state = "unloaded"
+            entry.resident_bytes = 0
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        model_resident_bytes.labels(model=entry.name).set(entry.resident_bytes)
+        model_unloads.labels(model=entry.name, reason=reason).inc()
+        logger.info("model %s %s (%s)", entry.name, "downcast" if action == "downcast" else "unloaded", reason)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.resident_bytes for entry in self._models.values())
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "name": entry.name,
+                "device": entry.device,
+                "state": entry.state,
+                "residentBytes": entry.resident_bytes,
+                "idleSeconds": round(now - entry.last_used, 1),
+                "inUse": entry.in_use,
+            }
+            for entry in self._models.values()
+        ]
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import io
+import wave
+from typing import Awaitable, Callable, List, Tuple
+
+import numpy as np
+
+from .decoding import Segment
+from .vad import EnergyVad
+
+SAMPLE_RATE = 16000
+# Whisper's window: packed regions never exceed it, longer regions are
+# decoded window by window.
+MAX_CHUNK_SECONDS = 30.0
+# Pauses shorter than this stay inside a speech region.
+MIN_SILENCE_SECONDS = 0.5
+# Context kept around each region so onsets and word endings survive.
+PAD_SECONDS = 0.2
+# The VAD noise floor adapts block by block across a recording.
+VAD_BLOCK_SECONDS = 5.0
+# A region longer than a window is cut at its quietest point within this
+# much of the window's end, ideally a breath between words.
+CUT_SEARCH_SECONDS = 5.0
+CUT_FRAME_SECONDS = 0.02
+
+
+def read_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decode a 16-bit PCM WAV file to mono float32 samples and its sample rate."""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as reader:
+            channels = reader.getnchannels()
+            width = reader.getsampwidth()
+            sample_rate = reader.getframerate()
+            frames = reader.readframes(reader.getnframes())
+    except (wave.Error, EOFError) as exc:
+        raise ValueError(f"Invalid WAV file: {exc}") from exc
+    if width != 2:
+        raise ValueError("Only 16-bit PCM WAV files are supported")
+    samples = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples[: samples.size - samples.size % channels].reshape(-1, channels).mean(axis=1)
+    return samples.astype(np.float32), sample_rate
+
+
+def speech_regions(audio: np.ndarray, vad: EnergyVad | None = None) -> List[Tuple[int, int]]:
+    """Sample ranges of ``audio`` (16 kHz) that contain speech, padded and merged."""
+    vad = vad or EnergyVad()
+    block = int(VAD_BLOCK_SECONDS * SAMPLE_RATE)
+    flags = np.concatenate(
+        [vad.speech_frames(audio[start : start + block]) for start in range(0, audio.size, block)]
+        or [np.zeros(0, dtype=bool)]
+    )
+    speech = np.flatnonzero(flags)
+    if speech.size == 0:
+        return []
+
+    frame = vad.frame_length
+    gap = max(int(MIN_SILENCE_SECONDS / vad.frame_seconds), 1)
+    pad = int(PAD_SECONDS * SAMPLE_RATE)
+    # A new region starts wherever consecutive speech frames are a long pause apart.
+    breaks = np.flatnonzero(np.diff(speech) > gap)
+    starts = np.concatenate(([speech[0]], speech[breaks + 1]))
+    ends = np.concatenate((speech[breaks], [speech[-1]])) + 1
+
+    regions: List[Tuple[int, int]] = []
+    for start, end in zip(starts * frame, ends * frame):
+        start, end = max(int(start) - pad, 0), min(int(end) + pad, audio.size)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def quietest_cut(audio: np.ndarray, start: int, end: int) -> int:
+    """Sample index in ``[start, end)`` at the centre of the lowest-energy frame."""
+    frame = int(CUT_FRAME_SECONDS * SAMPLE_RATE)
+    count = (end - start) // frame
+    if count < 2:
+        return end
+    frames = audio[start : start + count * frame].reshape(count, frame)
+    energy = np.einsum("ij,ij->i", frames, frames)
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+def pack_chunks(regions: List[Tuple[int, int]], max_seconds: float = MAX_CHUNK_SECONDS) -> List[Tuple[int, int]]:
+    """Group consecutive regions into chunks of at most ``max_seconds``.
+
+    Fewer, fuller windows mean fewer decoder passes.  A region that is longer
+    than a window on its own stays one chunk; :func:`transcribe_chunk` walks
+    it window by window.
+    """
+    limit = int(max_seconds * SAMPLE_RATE)
+    chunks: List[Tuple[int, int]] = []
+    for start, end in regions:
+        if chunks and end - chunks[-1][0] <= limit:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return chunks
+
+
+async def transcribe_chunk(
+    decode: Callable[[np.ndarray], Awaitable[List[Segment]]],
+    audio: np.ndarray,
+    start: int,
+    end: int,
+    max_seconds: float = MAX_CHUNK_SECONDS,
+) -> List[Segment]:
+    """Decode ``audio[start:end]`` window by window; segment times are relative to ``start``.
+
+    Windows are cut at the quietest point near ``max_seconds``.  As in
+    ``whisper.transcribe``, a window whose last segment is unfinished (the
+    window edge or the token cap came first) is only trusted up to that
+    segment's opening timestamp, and the next window starts there, so words
+    at the end of a window are decoded again rather than lost.
+    """
+    limit = int(max_seconds * SAMPLE_RATE)
+    search = min(int(CUT_SEARCH_SECONDS * SAMPLE_RATE), limit // 2)
+    segments: List[Segment] = []
+    position = start
+    while position < end:
+        stop = end if end - position <= limit else quietest_cut(audio, position + limit - search, position + limit)
+        window = await decode(audio[position:stop])
+        advance = stop - position
+        if window and not window[-1].complete and window[-1].start > 0:
+            advance = min(int(round(window[-1].start * SAMPLE_RATE)), advance)
+            window = window[:-1]
+        offset = (position - start) / SAMPLE_RATE
+        segments.extend(Segment(offset + seg.start, offset + seg.end, seg.text, seg.complete) for seg in window)
+        position += advance
+    return segments
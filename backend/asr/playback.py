@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Room echo and client-side buffering keep the speaker audible a little past
+# the nominal end of the clip.
+TAIL_SECONDS = 0.3
+# A playback that never reports its end (tab closed mid-reply) stops counting after this.
+MAX_OPEN_SECONDS = 60.0
+# No reported or estimated window is longer than this, whatever a stream claims.
+MAX_WINDOW_SECONDS = 600.0
+OPUS_GRANULE_RATE = 48000
+# An Ogg stream's duration is trusted up to this multiple of what its size
+# takes to play at the nominal bitrate.
+BITRATE_MARGIN = 2.0
+
+# capture pattern, version, header type, granule position, serial, sequence, CRC, segment count
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+_CAPTURE = b"OggS"
+_BEGIN_OF_STREAM = 0x02
+
+
+class PlaybackTracker:
+    """When each kiosk (device id) is playing the concierge's own voice.
+
+    Windows come either from explicit start/stop signals sent by the client,
+    or from the server's own estimate (the reply's audio duration, counted
+    from when it was sent).  An explicit stop always wins.
+    """
+
+    def __init__(self, tail_seconds: float = TAIL_SECONDS) -> None:
+        self.tail_seconds = tail_seconds
+        self._windows: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, device_id: str, duration: Optional[float] = None, now: Optional[float] = None) -> None:
+        """Playback begins now; without a duration it lasts until :meth:`stop` (or the cap)."""
+        now = time.monotonic() if now is None else now
+        end = now + min(duration if duration is not None else MAX_OPEN_SECONDS, MAX_WINDOW_SECONDS)
+        with self._lock:
+            self._prune(now)
+            self._windows[device_id] = (now, end)
+
+    def extend(self, device_id: str, duration: float) -> None:
+        """Set the length of the current window, measured from its start."""
+        with self._lock:
+            window = self._windows.get(device_id)
+            if window is not None:
+                self._windows[device_id] = (window[0], window[0] + min(max(duration, 0.0), MAX_WINDOW_SECONDS))
+
+    def stop(self, device_id: str, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            window = self._windows.get(device_id)
+            if window is not None:
+                self._windows[device_id] = (window[0], min(window[1], now))
+
+    def playing(self, device_id: str, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        window = self._windows.get(device_id)
+        return window is not None and window[0] <= now < window[1] + self.tail_seconds
+
+    def _prune(self, now: float) -> None:
+        stale = [key for key, (_, end) in self._windows.items() if end + self.tail_seconds < now]
+        for key in stale:
+            del self._windows[key]
+
+
+playback = PlaybackTracker()
+
+
+class OggDurationCounter:
+    """Running duration of an Ogg Opus stream, fed in arbitrary byte chunks.
+
+    Every Ogg page header carries the granule position (48 kHz samples for
+    Opus) reached by the end of the page, so the last page seen gives the
+    audio length so far.  Pages are walked header by header (27 bytes, the
+    segment table, then the body it describes), so packet data that happens
+    to contain ``OggS`` is never read as a header, and only pages of the
+    first logical stream count.  With ``bitrate`` the result is capped at
+    ``BITRATE_MARGIN`` times the playing time of the bytes seen, so a bogus
+    granule cannot open an endless playback window.  Pre-skip (a few
+    milliseconds) is ignored.
+    """
+
+    def __init__(self, bitrate: Optional[int] = None) -> None:
+        self.bitrate = bitrate
+        self.granule = 0
+        self.total = 0
+        self.serial: Optional[int] = None
+        self._buffer = bytearray()
+        # Body bytes of the current page still to be skipped.
+        self._skip = 0
+
+    def feed(self, data: bytes) -> float:
+        self.total += len(data)
+        if self._skip >= len(data):
+            self._skip -= len(data)
+            return self.seconds
+        self._buffer += data[self._skip :]
+        self._skip = 0
+        buffer = self._buffer
+        while len(buffer) >= _PAGE_HEADER.size:
+            if buffer[:4] != _CAPTURE:
+                # Lost sync (corrupt or truncated data): resume at the next capture pattern.
+                position = buffer.find(_CAPTURE, 1)
+                del buffer[: position if position != -1 else len(buffer) - 3]
+                continue
+            _, version, flags, granule, serial, _, _, segments = _PAGE_HEADER.unpack_from(buffer)
+            if version != 0:
+                del buffer[:1]
+                continue
+            header_size = _PAGE_HEADER.size + segments
+            if len(buffer) < header_size:
+                break
+            body_size = sum(buffer[_PAGE_HEADER.size : header_size])
+            if self.serial is None and flags & _BEGIN_OF_STREAM:
+                self.serial = serial
+            # -1 marks a page on which no packet ends.
+            if serial == self.serial and granule >= 0:
+                self.granule = max(self.granule, granule)
+            page_size = header_size + body_size
+            if len(buffer) < page_size:
+                self._skip = page_size - len(buffer)
+                buffer.clear()
+                break
+            del buffer[:page_size]
+        return self.seconds
+
+    @property
+    def seconds(self) -> float:
+        seconds = self.granule / OPUS_GRANULE_RATE
+        if self.bitrate:
+            seconds = min(seconds, BITRATE_MARGIN * self.total * 8 / self.bitrate)
+        return seconds
+
+
+class PcmDurationCounter:
+    """Running duration of a 16-bit mono PCM stream, after ``header_bytes`` (44 for WAV)."""
+
+    def __init__(self, sample_rate: int, header_bytes: int = 0) -> None:
+        self.sample_rate = sample_rate
+        self.header_bytes = header_bytes
+        self.total = 0
+
+    def feed(self, data: bytes) -> float:
+        self.total += len(data)
+        return self.seconds
+
+    @property
+    def seconds(self) -> float:
+        return max(self.total - self.header_bytes, 0) / (2 * self.sample_rate)
+
+
+def ogg_opus_duration(data: bytes, bitrate: Optional[int] = None) -> float:
+    """Length in seconds of a complete Ogg Opus file (capped as in :class:`OggDurationCounter`)."""
+    counter = OggDurationCounter(bitrate)
+    return counter.feed(data)
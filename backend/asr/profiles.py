@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class DecodeProfile:
+    name: str
+    # Beam search width at temperature 0; None decodes greedily.
+    beam_size: Optional[int] = None
+    # Candidates sampled per fallback temperature.
+    best_of: Optional[int] = None
+    # Token cap per window; None keeps Whisper's default (half the text context).
+    sample_len: Optional[int] = None
+    without_timestamps: bool = False
+    # Temperatures retried when a decode looks like a hallucination or repetition loop.
+    fallback_temperatures: Tuple[float, ...] = ()
+
+
+PROFILES: Dict[str, DecodeProfile] = {
+    # Rough interim text: greedy, short, no timestamps, so nothing can be committed from it.
+    "partial": DecodeProfile("partial", sample_len=48, without_timestamps=True),
+    # Greedy with timestamps; the default for interim chunks so stable segments keep committing.
+    "streaming": DecodeProfile("streaming", sample_len=128),
+    # Full quality for the text the client keeps.
+    "final": DecodeProfile("final", beam_size=5, best_of=5, fallback_temperatures=(0.2, 0.4, 0.6, 0.8, 1.0)),
+    # Recorded audio: full 30 s windows, greedy for throughput, fallback for robustness.
+    "offline": DecodeProfile("offline", best_of=5, fallback_temperatures=(0.2, 0.4, 0.6, 0.8, 1.0)),
+}
+# Cheapest first; budgets only ever move a request down this list.
+PROFILE_ORDER: Tuple[str, ...] = ("partial", "streaming", "final")
+
+
+class ProfileSelector:
+    """Pick the best decode profile expected to finish within a latency budget.
+
+    Service time per profile (a batch's dispatch to its completion, no
+    queueing) is fitted as ``base + rate * window_seconds`` by exponentially
+    weighted least squares, so a short window is not judged by the last long
+    one.  Until windows of different lengths have been seen the time is taken
+    as proportional to the window.  A request that would wait behind
+    ``queued_batches`` other batches is expected to take that many extra
+    service times, so a long queue downgrades the profile.
+    """
+
+    def __init__(self, smoothing: float = 0.2) -> None:
+        self._smoothing = smoothing
+        # Per profile: weighted sums of 1, x, y, x*x and x*y (x = window seconds, y = service seconds).
+        self._sums: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, profile: str, seconds: float, window_seconds: float) -> None:
+        with self._lock:
+            sums = self._sums.get(profile)
+            if sums is None:
+                sums = self._sums[profile] = [0.0] * 5
+            else:
+                sums[:] = [value * (1.0 - self._smoothing) for value in sums]
+            for index, value in enumerate(
+                (1.0, window_seconds, seconds, window_seconds * window_seconds, window_seconds * seconds)
+            ):
+                sums[index] += value
+
+    def estimate(self, profile: str, window_seconds: float, queued_batches: int = 0) -> Optional[float]:
+        with self._lock:
+            sums = self._sums.get(profile)
+            if sums is None:
+                return None
+            weight, sx, sy, sxx, sxy = sums
+        mean_x, mean_y = sx / weight, sy / weight
+        variance = sxx / weight - mean_x * mean_x
+        if variance > 1e-6:
+            rate = max((sxy / weight - mean_x * mean_y) / variance, 0.0)
+            service = max(mean_y + rate * (window_seconds - mean_x), 0.0)
+        elif mean_x > 0:
+            service = mean_y * window_seconds / mean_x
+        else:
+            service = mean_y
+        return service * (queued_batches + 1)
+
+    def choose(
+        self, requested: str, budget_seconds: Optional[float], window_seconds: float, queued_batches: int = 0
+    ) -> str:
+        if budget_seconds is None:
+            return requested
+        candidates = PROFILE_ORDER[: PROFILE_ORDER.index(requested) + 1]
+        for name in reversed(candidates):
+            expected = self.estimate(name, window_seconds, queued_batches)
+            # Profiles without a measurement yet are given the benefit of the doubt.
+            if expected is None or expected <= budget_seconds:
+                return name
+        return PROFILE_ORDER[0]
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# One file per session: the magic line, then one record per request to
+# /speech/stream.  Each record is a fixed header followed by the Content-Type,
+# the transcript the server answered with, and the request body verbatim.
+MAGIC = b"IKONSPEECH1\n"
+# offset since session start (s), sample rate (0 = none), flags,
+# content-type length, text length, body length
+_RECORD = struct.Struct("<dIBBII")
+SUFFIX = ".speech"
+_FINALIZE = 1  # the client sent X-Finalize
+_IS_FINAL = 2  # the reply closed the utterance (finalize or server-side endpoint)
+
+
+@dataclass
+class RecordedChunk:
+    offset: float
+    sample_rate: Optional[int]
+    content_type: str
+    finalize: bool
+    # Reply as recorded: transcript and whether it closed the utterance.
+    is_final: bool
+    text: str
+    data: bytes
+
+
+def _safe_name(session_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)[:80] or "session"
+
+
+class SpeechRecorder:
+    """Append every chunk of each speech session to its own file under ``directory``.
+
+    :meth:`record` and :meth:`close` only queue the work; one writer thread
+    opens, writes and closes the files in call order, so disk latency never
+    blocks the event loop.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._files: Dict[str, BinaryIO] = {}
+        self._started: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # (session id, record bytes, or None to close the session's file); None stops the writer.
+        self._queue: "queue.Queue[Optional[Tuple[str, Optional[bytes]]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def start_time(self, session_id: str) -> float:
+        """Monotonic time of the session's first chunk."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="speech-recorder", daemon=True)
+                self._writer.start()
+            return self._started.setdefault(session_id, time.monotonic())
+
+    def record(
+        self,
+        session_id: str,
+        arrived_at: float,
+        data: bytes,
+        sample_rate: Optional[int],
+        content_type: str,
+        finalize: bool,
+        text: str,
+        is_final: bool,
+    ) -> None:
+        """Write one chunk; ``arrived_at`` is the request's ``time.monotonic()``."""
+        offset = max(arrived_at - self.start_time(session_id), 0.0)
+        kind = content_type.encode()[:255]
+        body = text.encode()
+        flags = (_FINALIZE if finalize else 0) | (_IS_FINAL if is_final else 0)
+        header = _RECORD.pack(offset, sample_rate or 0, flags, len(kind), len(body), len(data))
+        self._queue.put((session_id, header + kind + body + data))
+
+    def close(self, session_id: str) -> None:
+        with self._lock:
+            started = self._started.pop(session_id, None)
+        if started is not None:
+            self._queue.put((session_id, None))
+
+    def stop(self) -> None:
+        """Write everything still queued, close all files and end the writer thread.
+
+        A later :meth:`record` starts a new writer.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+            self._started.clear()
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            session_id, record = item
+            try:
+                if record is None:
+                    handle = self._files.pop(session_id, None)
+                    if handle is not None:
+                        handle.close()
+                    continue
+                handle = self._files.get(session_id) or self._open(session_id)
+                handle.write(record)
+                handle.flush()
+            except OSError:
+                logger.exception("could not record speech session %s", session_id)
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+
+    def _open(self, session_id: str) -> BinaryIO:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(self.directory, f"{stamp}-{_safe_name(session_id)}{SUFFIX}")
+        handle = open(path, "ab")
+        if handle.tell() == 0:
+            handle.write(MAGIC)
+        self._files[session_id] = handle
+        return handle
+
+
+def read_recording(path: str) -> Iterator[RecordedChunk]:
+    """Yield the chunks of one recorded session in arrival order."""
+    with open(path, "rb") as handle:
+        if handle.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a speech recording")
+        while True:
+            header = handle.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            offset, sample_rate, flags, kind_len, text_len, data_len = _RECORD.unpack(header)
+            payload = handle.read(kind_len + text_len + data_len)
+            if len(payload) < kind_len + text_len + data_len:
+                # A recording cut off mid-write (server killed) ends at its last whole chunk.
+                return
+            yield RecordedChunk(
+                offset=offset,
+                sample_rate=sample_rate or None,
+                content_type=payload[:kind_len].decode(),
+                finalize=bool(flags & _FINALIZE),
+                is_final=bool(flags & _IS_FINAL),
+                text=payload[kind_len : kind_len + text_len].decode(),
+                data=payload[kind_len + text_len :],
+            )
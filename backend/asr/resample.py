@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+TARGET_SAMPLE_RATE = 16000
+# Filter design: zero crossings per side of the windowed sinc, passband edge
+# relative to the output Nyquist, and the Kaiser window shape.
+ZERO_CROSSINGS = 16
+ROLLOFF = 0.94
+KAISER_BETA = 8.6
+
+
+@lru_cache(maxsize=32)
+def _filter_bank(orig_sr: int, target_sr: int) -> Tuple[int, int, int, np.ndarray]:
+    """Return ``(up, down, half_length, bank)`` for resampling ``orig_sr`` to ``target_sr``.
+
+    ``bank[q, t]`` is tap ``t`` of polyphase branch ``q`` of a Kaiser-windowed
+    sinc low-pass designed at the virtual upsampled rate ``orig_sr * up``.
+    Banks are computed once per rate pair and shared by every stream.
+    """
+    common = gcd(orig_sr, target_sr)
+    up, down = target_sr // common, orig_sr // common
+    cutoff = ROLLOFF / max(up, down)
+    half = int(np.ceil(ZERO_CROSSINGS / cutoff))
+    taps = -(-(2 * half + 1) // up)
+
+    # Offsets m = q - half + t * up of the centred prototype filter.
+    offsets = np.arange(up)[:, None] - half + np.arange(taps)[None, :] * up
+    window = np.zeros(offsets.shape)
+    inside = np.abs(offsets) <= half
+    window[inside] = np.kaiser(2 * half + 1, KAISER_BETA)[offsets[inside] + half]
+    bank = (up * cutoff * np.sinc(cutoff * offsets) * window).astype(np.float32)
+    bank.setflags(write=False)
+    return up, down, half, bank
+
+
+class StreamingResampler:
+    """Polyphase windowed-sinc resampler that keeps filter state across chunks.
+
+    Feeding a stream chunk by chunk gives the same samples as resampling the
+    concatenated audio in one go, so chunk boundaries do not click.  Outputs
+    that still need future input are held back until the next chunk (a few
+    milliseconds); :meth:`flush` emits them at the end of a stream.
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int = TARGET_SAMPLE_RATE) -> None:
+        if orig_sr <= 0 or target_sr <= 0:
+            raise ValueError("sample rate must be positive")
+        self.orig_sr = orig_sr
+        self.target_sr = target_sr
+        self._up, self._down, self._half, self._bank = _filter_bank(orig_sr, target_sr)
+        taps = self._bank.shape[1]
+        # Reversed taps so a window of consecutive inputs is a plain dot product.
+        self._reversed_bank = np.ascontiguousarray(self._bank[:, ::-1])
+        # Input history, starting at absolute input index ``_history_start``;
+        # samples before the stream start are zeros.
+        self._history = np.zeros(taps, dtype=np.float32)
+        self._history_start = -taps
+        self._next_output = 0
+        self._consumed = 0
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._history.nbytes
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """Resample the next chunk of the stream."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self._up == self._down:
+            return chunk
+        self._consumed += chunk.size
+        return self._run(chunk, limit=None)
+
+    def flush(self) -> np.ndarray:
+        """Emit the outputs held back for lack of future input."""
+        if self._up == self._down:
+            return np.zeros(0, dtype=np.float32)
+        padding = np.zeros(self._half // self._up + 1, dtype=np.float32)
+        total = -(-self._consumed * self._up // self._down)
+        return self._run(padding, limit=total)
+
+    def _run(self, chunk: np.ndarray, limit: int | None) -> np.ndarray:
+        up, down, half, bank = self._up, self._down, self._half, self._bank
+        x = np.concatenate((self._history, chunk)) if self._history.size else chunk
+        end = self._history_start + x.size
+
+        # Output n needs inputs up to (n * down + half) // up.
+        stop = -(-(end * up - half) // down)
+        if limit is not None:
+            stop = min(stop, limit)
+        if stop <= self._next_output:
+            self._keep_history(x)
+            return np.zeros(0, dtype=np.float32)
+
+        # Outputs that share a polyphase branch are ``up`` apart and their input
+        # windows ``down`` apart, so each branch is one strided matrix-vector product.
+        taps = bank.shape[1]
+        windows = sliding_window_view(x, taps)
+        count = stop - self._next_output
+        out = np.empty(count, dtype=np.float32)
+        for offset in range(min(up, count)):
+            position = (self._next_output + offset) * down + half
+            first = position // up - self._history_start - (taps - 1)
+            rows = -(-(count - offset) // up)
+            out[offset::up] = windows[first : first + (rows - 1) * down + 1 : down] @ self._reversed_bank[position % up]
+        self._next_output = stop
+        self._keep_history(x)
+        return out
+
+    def _keep_history(self, x: np.ndarray) -> None:
+        oldest = (self._next_output * self._down + self._half) // self._up - (self._bank.shape[1] - 1)
+        oldest = max(min(oldest, self._history_start + x.size), self._history_start)
+        self._history = x[oldest - self._history_start :].copy()
+        self._history_start = oldest
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Resample a complete signal."""
+    if orig_sr == target_sr:
+        return np.asarray(audio, dtype=np.float32)
+    resampler = StreamingResampler(orig_sr, target_sr)
+    head = resampler.process(audio)
+    tail = resampler.flush()
+    return np.concatenate((head, tail)) if tail.size else head
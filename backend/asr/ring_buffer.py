@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import numpy as np
+
+# Smallest ring allocated once samples arrive (about 1 s at 16 kHz).
+MIN_ALLOCATION = 1 << 14
+
+
+class AudioRingBuffer:
+    """Bounded float32 FIFO with zero-copy contiguous reads.
+
+    Storage is an array of twice the ring size in which every sample is
+    written at ``i`` and ``i + ring``.  Any window of at most the ring size
+    is therefore a plain slice, so :meth:`view` never copies, and appends
+    cost O(chunk) regardless of how much is buffered.  The ring starts empty
+    and doubles as audio arrives, up to ``capacity``; once full, an append
+    drops the oldest samples.
+
+    Memory is 8 bytes per ring sample, at most ``8 * capacity`` (3.8 MB for
+    30 s at 16 kHz); an idle session holds nothing and a short utterance
+    only what it used.  A view stays valid until the buffer overflows or is
+    cleared; appends that fit in the free space never touch the samples it
+    covers, and growing copies into new storage, leaving old views intact.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._ring = 0
+        self._storage = np.zeros(0, dtype=np.float32)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._storage.nbytes
+
+    def append(self, chunk: np.ndarray) -> int:
+        """Append samples and return how many old samples were dropped."""
+        if chunk.size == 0:
+            return 0
+        if chunk.size > self.capacity:
+            chunk = chunk[-self.capacity :]
+        needed = self._size + chunk.size
+        if needed > self._ring and self._ring < self.capacity:
+            self._grow(min(max(needed, 2 * self._ring, MIN_ALLOCATION), self.capacity))
+        dropped = max(needed - self._ring, 0)
+        if dropped:
+            self.consume(dropped)
+
+        cap = self._ring
+        pos = (self._start + self._size) % cap
+        first = min(chunk.size, cap - pos)
+        self._storage[pos : pos + first] = chunk[:first]
+        self._storage[pos + cap : pos + cap + first] = chunk[:first]
+        rest = chunk.size - first
+        if rest:
+            self._storage[:rest] = chunk[first:]
+            self._storage[cap : cap + rest] = chunk[first:]
+        self._size += chunk.size
+        return dropped
+
+    def consume(self, count: int) -> None:
+        """Drop ``count`` samples from the front."""
+        count = min(max(count, 0), self._size)
+        if count:
+            self._start = (self._start + count) % self._ring
+            self._size -= count
+
+    def keep_last(self, count: int) -> None:
+        """Drop everything except the newest ``count`` samples."""
+        self.consume(self._size - max(count, 0))
+
+    def clear(self) -> None:
+        self._start = 0
+        self._size = 0
+
+    def _grow(self, ring: int) -> None:
+        storage = np.zeros(2 * ring, dtype=np.float32)
+        current = self.view()
+        storage[: self._size] = current
+        storage[ring : ring + self._size] = current
+        self._storage, self._ring, self._start = storage, ring, 0
+
+    def view(self, length: int | None = None) -> np.ndarray:
+        """Return the oldest ``length`` buffered samples (all by default) without copying."""
+        length = self._size if length is None else min(max(length, 0), self._size)
+        return self._storage[self._start : self._start + length]
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Callable, Generic, List, Optional, Sequence, Set, Tuple, TypeVar
+
+JobT = TypeVar("JobT")
+ResultT = TypeVar("ResultT")
+
+
+class BatchScheduler(Generic[JobT, ResultT]):
+    """Collect jobs from concurrent callers and run them as one batch.
+
+    The first job of a batch opens a collection window of ``window_ms``; every
+    job submitted before it closes (up to ``max_batch``) is handed to
+    ``run_batch`` together.  At most ``concurrency`` batches run at once in the
+    default executor, so jobs that arrive while the model is busy naturally
+    pile up into the next batch.  ``run_batch`` must return one result per job,
+    in order.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[JobT]], Sequence[ResultT]],
+        window_ms: float = 30.0,
+        max_batch: int = 8,
+        concurrency: int = 1,
+    ) -> None:
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self._run_batch = run_batch
+        self._window = max(window_ms, 0.0) / 1000.0
+        self._max_batch = max_batch
+        self._concurrency = concurrency
+        self._queue: Optional[asyncio.Queue[Tuple[JobT, asyncio.Future]]] = None
+        self._idle: Optional[asyncio.Semaphore] = None
+        self._running: Set[asyncio.Task] = set()
+        self._worker: Optional[asyncio.Task] = None
+        # The batch the collector is filling, so close() can fail it too.
+        self._collecting: List[Tuple[JobT, asyncio.Future]] = []
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, job: JobT) -> ResultT:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._idle = asyncio.Semaphore(self._concurrency)
+            self._worker = loop.create_task(self._collect())
+        future: asyncio.Future = loop.create_future()
+        assert self._queue is not None
+        await self._queue.put((job, future))
+        return await future
+
+    async def close(self) -> None:
+        """Stop collecting and fail every job that has not been dispatched yet.
+
+        Batches already running are left to finish and deliver their results.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        waiting = self._collecting
+        self._collecting = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                waiting.append(self._queue.get_nowait())
+        error = RuntimeError("batch scheduler closed")
+        for _, future in waiting:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _collect(self) -> None:
+        assert self._queue is not None and self._idle is not None
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            # Only start collecting once a batch slot is free; jobs queue up meanwhile.
+            await self._idle.acquire()
+            batch = self._collecting = [await queue.get()]
+            deadline = loop.time() + self._window
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Callers that gave up (e.g. disconnected clients) are not decoded.
+            batch = [(job, future) for job, future in batch if not future.cancelled()]
+            self._collecting = []
+            if not batch:
+                self._idle.release()
+                continue
+            task = loop.create_task(self._dispatch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, batch: List[Tuple[JobT, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        jobs = [job for job, _ in batch]
+        try:
+            results: Sequence[Any] = await loop.run_in_executor(None, self._run_batch, jobs)
+            if len(results) != len(jobs):
+                raise RuntimeError("run_batch returned a result count that does not match the batch")
+        except Exception as exc:  # fan the failure out to every waiting caller
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            assert self._idle is not None
+            self._idle.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Generic, Iterator, List, Optional, Protocol, Set, Tuple, TypeVar
+
+from ..metrics import Counter, Gauge
+
+
+class _Expiring(Protocol):
+    last_updated: datetime
+    socket_bound: bool
+
+
+StateT = TypeVar("StateT", bound=_Expiring)
+
+sessions_active = Gauge("speech_sessions_active", "Speech sessions currently held in memory.")
+sessions_expired = Counter("speech_sessions_expired_total", "Speech sessions dropped after their TTL.")
+sessions_evicted = Counter("speech_sessions_evicted_total", "Speech sessions evicted to stay under the session cap.")
+
+
+class SessionStore(Generic[StateT]):
+    """Session map with timer-driven expiry and an LRU cap.
+
+    Lookups and inserts are plain dict operations; nothing on the request path
+    scans the sessions.  Every session has exactly one entry in a min-heap
+    keyed by its deadline.  A background reaper sleeps until the earliest
+    deadline, and when it pops a session that was touched in the meantime it
+    simply re-queues it at its new deadline.  Socket-bound sessions never
+    expire and are not evicted.  ``on_remove`` is called with the session id,
+    its state and the reason (``"expired"``, ``"evicted"`` or whatever the
+    caller of :meth:`remove` passed) whenever a session leaves the store.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], StateT],
+        ttl: timedelta,
+        max_sessions: int,
+        max_sleep_seconds: float = 30.0,
+        on_remove: Optional[Callable[[str, StateT, str], None]] = None,
+    ) -> None:
+        self._factory = factory
+        self._on_remove = on_remove
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._max_sleep = max_sleep_seconds
+        self._sessions: "OrderedDict[str, StateT]" = OrderedDict()
+        self._deadlines: List[Tuple[datetime, int, str]] = []
+        self._queued: Set[str] = set()
+        self._sequence = itertools.count()
+        self._reaper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def items(self) -> Iterator[Tuple[str, StateT]]:
+        return iter(list(self._sessions.items()))
+
+    def get(self, session_id: str) -> StateT:
+        """Return the session, creating it (and evicting the LRU one if needed)."""
+        self._ensure_reaper()
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+            return state
+        return self.add(session_id, self._factory())
+
+    def add(self, session_id: str, state: StateT) -> StateT:
+        self._ensure_reaper()
+        while len(self._sessions) >= self.max_sessions and self._evict_one():
+            pass
+        self._sessions[session_id] = state
+        if session_id not in self._queued:
+            heapq.heappush(self._deadlines, (state.last_updated + self.ttl, next(self._sequence), session_id))
+            self._queued.add(session_id)
+        sessions_active.set(len(self._sessions))
+        return state
+
+    def remove(self, session_id: str, reason: str = "removed") -> Optional[StateT]:
+        # The heap entry is discarded lazily when it comes due.
+        state = self._sessions.pop(session_id, None)
+        sessions_active.set(len(self._sessions))
+        if state is not None and self._on_remove is not None:
+            self._on_remove(session_id, state, reason)
+        return state
+
+    def _evict_one(self) -> bool:
+        for session_id, state in self._sessions.items():
+            if not state.socket_bound:
+                self.remove(session_id, "evicted")
+                sessions_evicted.inc()
+                return True
+        return False
+
+    def reap(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Expire due sessions; return the next deadline, if any."""
+        now = now or datetime.utcnow()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, session_id = heapq.heappop(self._deadlines)
+            state = self._sessions.get(session_id)
+            if state is None:
+                self._queued.discard(session_id)
+                continue
+            deadline = now + self.ttl if state.socket_bound else state.last_updated + self.ttl
+            if deadline > now:
+                heapq.heappush(self._deadlines, (deadline, next(self._sequence), session_id))
+                continue
+            self.remove(session_id, "expired")
+            self._queued.discard(session_id)
+            sessions_expired.inc()
+        return self._deadlines[0][0] if self._deadlines else None
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._reaper = loop.create_task(self._run_reaper())
+
+    async def _run_reaper(self) -> None:
+        # New sessions are due a full TTL from now, so sleeping until the
+        # earliest known deadline (capped) never misses one.
+        while True:
+            next_deadline = self.reap()
+            delay = self._max_sleep
+            if next_deadline is not None:
+                delay = min(max((next_deadline - datetime.utcnow()).total_seconds(), 0.0), delay)
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        self._ensure_reaper()
+
+    async def stop(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class EnergyVad:
+    """Frame-level voice activity detector based on energy and zero crossings.
+
+    Audio is split into fixed frames; a frame counts as speech when its energy
+    clears an adaptive noise floor by ``margin_db``.  Quiet frames with a very
+    high zero-crossing rate (hiss, fan noise) are rejected unless they are
+    clearly loud.  One instance keeps state for one audio stream: the noise
+    floor estimate and the samples left over from the previous chunk.
+    """
+
+    def __init__(
+        self,
+        frame_ms: float = 20.0,
+        margin_db: float = 10.0,
+        min_energy_db: float = -55.0,
+        max_zcr: float = 0.35,
+        initial_floor_db: float = -45.0,
+        adapt_rate: float = 0.1,
+        sample_rate: int = SAMPLE_RATE,
+    ) -> None:
+        self.frame_length = max(int(sample_rate * frame_ms / 1000.0), 1)
+        self.frame_seconds = self.frame_length / float(sample_rate)
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.max_zcr = max_zcr
+        self.initial_floor_db = initial_floor_db
+        self.adapt_rate = adapt_rate
+        self.noise_floor_db: float | None = None
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    def speech_frames(self, audio: np.ndarray) -> np.ndarray:
+        """Return one speech flag per complete frame in ``audio``.
+
+        Samples that do not fill a whole frame are kept and prepended to the
+        next call, so flags line up with the continuous stream.
+        """
+        if self._tail.size:
+            audio = np.concatenate((self._tail, audio))
+        n_frames = audio.size // self.frame_length
+        used = n_frames * self.frame_length
+        self._tail = audio[used:].copy()
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+
+        frames = audio[:used].reshape(n_frames, self.frame_length)
+        energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(self.frame_length - 1)
+
+        # The quietest frames of a chunk are a good estimate of the background;
+        # follow drops immediately and rises slowly.  The first estimate is
+        # capped so a stream that starts mid-sentence is not taken for noise.
+        quiet = float(np.percentile(energy_db, 10))
+        if self.noise_floor_db is None:
+            self.noise_floor_db = min(quiet, self.initial_floor_db)
+        elif quiet < self.noise_floor_db:
+            self.noise_floor_db = quiet
+        else:
+            self.noise_floor_db += self.adapt_rate * (quiet - self.noise_floor_db)
+
+        threshold = max(self.noise_floor_db + self.margin_db, self.min_energy_db)
+        loud = energy_db > threshold
+        return loud & ((zcr < self.max_zcr) | (energy_db > threshold + self.margin_db))
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._tail.nbytes
+
+    def reset(self) -> None:
+        self._tail = np.zeros(0, dtype=np.float32)
@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .decoding import SAMPLE_RATE, DecodeJob, Segment, n_mels_for
+from .features import N_FRAMES
+
+logger = logging.getLogger(__name__)
+
+SLOT_SAMPLES = 16000 * 30
+# Generous enough to cover a cold model load in a freshly (re)started worker.
+WORKER_TIMEOUT_SECONDS = 300.0
+# How often the result listener checks that every worker is still alive.
+LIVENESS_INTERVAL_SECONDS = 0.5
+# A worker that keeps dying before it is ready is restarted after 1, 2, 4...
+# seconds (capped), and given up on after this many attempts in a row.
+RESTART_BACKOFF_SECONDS = 1.0
+MAX_RESTART_BACKOFF_SECONDS = 30.0
+MAX_RESTARTS = 5
+
+
+def split_cores(workers: int, cores: Optional[Sequence[int]] = None) -> List[Set[int]]:
+    """Split the available cores into ``workers`` disjoint, contiguous sets."""
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    cores = list(cores)
+    if workers > len(cores):
+        return [set(cores) for _ in range(workers)]
+    return [set(part.tolist()) for part in np.array_split(np.array(cores), workers)]
+
+
+def parse_core_sets(spec: str) -> List[Set[int]]:
+    """Parse ``"0-7;8-15"`` into one core set per worker."""
+    sets: List[Set[int]] = []
+    for group in filter(None, (part.strip() for part in spec.split(";"))):
+        cores: Set[int] = set()
+        for item in filter(None, (part.strip() for part in group.split(","))):
+            if "-" in item:
+                low, high = item.split("-", 1)
+                cores.update(range(int(low), int(high) + 1))
+            else:
+                cores.add(int(item))
+        sets.append(cores)
+    return sets
+
+
+def _worker_main(
+    index: int,
+    cores: Set[int],
+    backend_name: str,
+    model_name: str,
+    device: str,
+    shm_name: str,
+    slot_count: int,
+    requests: mp.Queue,
+    results: mp.Queue,
+) -> None:
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+
+    from .backends import get_backend
+
+    torch.set_num_threads(max(len(cores), 1))
+    # Spawned workers share the API process's resource tracker, which unlinks
+    # the segment when the pool closes it.
+    shm = SharedMemory(name=shm_name)
+    slab = np.ndarray((slot_count, SLOT_SAMPLES), dtype=np.float32, buffer=shm.buf)
+
+    try:
+        backend = get_backend(backend_name)
+        model = backend.load(model_name, device)
+    except Exception as exc:
+        results.put(("failed", index, repr(exc)))
+        shm.close()
+        return
+    results.put(("ready", index, None))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        batch_id, entries = message
+        try:
+            jobs = [_slot_job(slab[slot], *entry) for slot, *entry in entries]
+            results.put(("result", batch_id, backend.decode(model, jobs)))
+        except Exception as exc:
+            results.put(("error", batch_id, repr(exc)))
+    del slab
+    shm.close()
+
+
+def _slot_job(slot: np.ndarray, length: int, prompt: str, n_mels: int, profile: str) -> DecodeJob:
+    # A slot holds either raw audio or, when the session precomputed it, the
+    # flattened log-mel input; ``length`` is always the audio length.
+    if n_mels:
+        mel = slot[: n_mels * N_FRAMES].reshape(n_mels, N_FRAMES)
+        empty = np.zeros(0, dtype=np.float32)
+        return DecodeJob(empty, prompt, mel=mel, duration=length / SAMPLE_RATE, profile=profile)
+    return DecodeJob(slot[:length], prompt, profile=profile)
+
+
+class AsrWorkerPool:
+    """Whisper replicas in separate processes, fed through shared memory.
+
+    Audio windows (or their precomputed log-mel input) are written into fixed
+    slots of one shared-memory slab that the API process owns; only slot
+    indices, lengths and prompts travel over the per-worker control queues.
+    Each worker is pinned to its own core set and loads its own model, so API
+    workers stay thin and ASR replicas scale independently.  :meth:`run_batch` is blocking and meant to be called from
+    an executor thread (the batch scheduler does this).
+
+    A worker that cannot load the model is not restarted; once none is left
+    every pending and later batch fails with the load error.  A worker that
+    dies is restarted with a bounded backoff.  A batch's slots stay reserved
+    until its worker answers or is gone, so a timed-out batch cannot have its
+    slots overwritten while the worker still reads them.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        model_name: str,
+        device: str,
+        max_batch: int,
+        core_sets: Optional[List[Set[int]]] = None,
+        backend: str = "reference",
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.backend = backend
+        self.model_name = model_name
+        self.n_mels = n_mels_for(model_name)
+        self.device = device
+        self.core_sets = core_sets or split_cores(workers)
+        if len(self.core_sets) < workers:
+            raise ValueError("need one core set per worker")
+        # Two batches per worker can be in flight (one decoding, one queued).
+        self.slot_count = workers * max_batch * 2
+        self._context = mp.get_context("spawn")
+        self._shm: Optional[SharedMemory] = None
+        self._slab: Optional[np.ndarray] = None
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._results: Optional[mp.Queue] = None
+        self._requests: List[mp.Queue] = []
+        self._processes: List[Optional[mp.Process]] = []
+        # Per worker: batch id -> (future, slots the batch occupies).
+        self._inflight: List[Dict[int, Tuple[Future, List[int]]]] = []
+        self._ready: List[threading.Event] = []
+        self._failures: List[Optional[str]] = []
+        self._restarts: List[int] = []
+        self._restart_at: List[float] = []
+        self._batch_ids = itertools.count()
+        self._owner: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._closed = False
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._shm.size if self._shm is not None else 0
+
+    def start(self) -> None:
+        self._shm = SharedMemory(create=True, size=self.slot_count * SLOT_SAMPLES * 4)
+        self._slab = np.ndarray((self.slot_count, SLOT_SAMPLES), dtype=np.float32, buffer=self._shm.buf)
+        for slot in range(self.slot_count):
+            self._free_slots.put(slot)
+        self._results = self._context.Queue()
+        for index in range(self.workers):
+            self._requests.append(self._context.Queue())
+            self._processes.append(self._spawn(index))
+            self._inflight.append({})
+            self._ready.append(threading.Event())
+            self._failures.append(None)
+            self._restarts.append(0)
+            self._restart_at.append(0.0)
+        self._listener = threading.Thread(target=self._listen, name="asr-pool-results", daemon=True)
+        self._listener.start()
+
+    def wait_ready(self, timeout: float = WORKER_TIMEOUT_SECONDS) -> bool:
+        """Wait until every worker has loaded or given up; ``False`` on timeout.
+
+        Raises :class:`RuntimeError` when no worker could load the model.
+        """
+        deadline = time.monotonic() + timeout
+        for event in self._ready:
+            if not event.wait(max(deadline - time.monotonic(), 0.0)):
+                return False
+        if all(self._failures):
+            raise RuntimeError(f"no ASR worker could load {self.model_name}: {self._failures[0]}")
+        return True
+
+    def _spawn(self, index: int) -> mp.Process:
+        assert self._shm is not None and self._results is not None
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.core_sets[index],
+                self.backend,
+                self.model_name,
+                self.device,
+                self._shm.name,
+                self.slot_count,
+                self._requests[index],
+                self._results,
+            ),
+            name=f"asr-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def run_batch(self, jobs: List[DecodeJob]) -> List[List[Segment]]:
+        if self._slab is None or self._closed:
+            raise RuntimeError("ASR worker pool is not running")
+        slots = [self._free_slots.get() for _ in jobs]
+        future: Future = Future()
+        try:
+            entries = [self._write_slot(slot, job) for slot, job in zip(slots, jobs)]
+            with self._lock:
+                usable = [i for i in range(self.workers) if self._failures[i] is None]
+                if not usable:
+                    raise RuntimeError(f"no ASR worker could load {self.model_name}: {self._failures[0]}")
+                batch_id = next(self._batch_ids)
+                index = min(usable, key=lambda i: len(self._inflight[i]))
+                self._inflight[index][batch_id] = (future, slots)
+                self._owner[batch_id] = index
+        except BaseException:
+            self._release(slots)
+            raise
+        # From here on the slots belong to the batch: they are released when
+        # the worker answers for it or is found dead, never on a timeout.
+        self._requests[index].put((batch_id, entries))
+        try:
+            return future.result(timeout=WORKER_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            with self._lock:
+                pending = batch_id in self._inflight[index]
+            if not pending:
+                return future.result()
+            logger.error("ASR worker %s gave no answer in %.0fs; killing it", index, WORKER_TIMEOUT_SECONDS)
+            self._kill(index)
+            raise RuntimeError("ASR worker timed out") from None
+
+    def _write_slot(self, slot: int, job: DecodeJob) -> Tuple[int, int, str, int, str]:
+        """Copy a job's input into its slot; returns the control entry for the worker."""
+        # Session features follow the cascade's partial model, which may use
+        # another mel size than the pool's model; those jobs ship raw audio.
+        if job.mel is not None and job.mel.shape[0] == self.n_mels and job.mel.size <= SLOT_SAMPLES:
+            length = min(int(round(job.seconds * SAMPLE_RATE)), SLOT_SAMPLES)
+            self._slab[slot, : job.mel.size] = job.mel.ravel()
+            return (slot, length, job.prompt, job.mel.shape[0], job.profile)
+        audio = job.audio[:SLOT_SAMPLES]
+        self._slab[slot, : audio.size] = audio
+        return (slot, audio.size, job.prompt, 0, job.profile)
+
+    def _release(self, slots: List[int]) -> None:
+        for slot in slots:
+            self._free_slots.put(slot)
+
+    def _kill(self, index: int) -> None:
+        process = self._processes[index]
+        if process is not None and process.is_alive():
+            process.kill()
+
+    def _fail_inflight(self, index: int, error: Exception) -> None:
+        with self._lock:
+            lost = self._inflight[index]
+            self._inflight[index] = {}
+            for batch_id in lost:
+                self._owner.pop(batch_id, None)
+        for future, slots in lost.values():
+            self._release(slots)
+            future.set_exception(error)
+
+    def _listen(self) -> None:
+        assert self._results is not None
+        while not self._closed:
+            try:
+                message = self._results.get(timeout=LIVENESS_INTERVAL_SECONDS)
+            except queue.Empty:
+                message = None
+            except (EOFError, OSError):
+                break
+            if message is not None:
+                self._handle(*message)
+            # Every round, so a crash is noticed even while other workers keep answering.
+            self._check_workers()
+
+    def _handle(self, kind: str, key: int, payload) -> None:
+        if kind == "ready":
+            logger.info("ASR worker %s ready (%s/%s on %s)", key, self.model_name, self.backend, self.device)
+            self._restarts[key] = 0
+            self._ready[key].set()
+            return
+        if kind == "failed":
+            self._give_up(key, f"failed to load the model: {payload}")
+            return
+        with self._lock:
+            index = self._owner.pop(key, None)
+            entry = self._inflight[index].pop(key, None) if index is not None else None
+        if entry is None:
+            return
+        future, slots = entry
+        self._release(slots)
+        if kind == "result":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(f"ASR worker failed: {payload}"))
+
+    def _give_up(self, index: int, reason: str) -> None:
+        logger.error("ASR worker %s %s; not restarting it", index, reason)
+        with self._lock:
+            self._failures[index] = reason
+        self._fail_inflight(index, RuntimeError(f"ASR worker {reason}"))
+        # Counts as settled for wait_ready, which then reports the failure.
+        self._ready[index].set()
+
+    def _drop_requests(self, index: int) -> None:
+        # Batches the dead worker never picked up; their slots are about to be
+        # reused, so the replacement must not decode them.
+        while True:
+            try:
+                self._requests[index].get_nowait()
+            except queue.Empty:
+                return
+
+    def _check_workers(self) -> None:
+        if self._closed:
+            return
+        now = time.monotonic()
+        for index, process in enumerate(self._processes):
+            if self._failures[index] is not None:
+                continue
+            if process is None:
+                if now >= self._restart_at[index]:
+                    self._processes[index] = self._spawn(index)
+                continue
+            if process.is_alive():
+                continue
+            if not self._ready[index].is_set():
+                self._restarts[index] += 1
+            self._ready[index].clear()
+            self._drop_requests(index)
+            self._fail_inflight(index, RuntimeError("ASR worker exited during decode"))
+            if self._restarts[index] >= MAX_RESTARTS:
+                self._give_up(index, f"exited {self._restarts[index]} times before becoming ready")
+                continue
+            delay = min(RESTART_BACKOFF_SECONDS * 2 ** self._restarts[index], MAX_RESTART_BACKOFF_SECONDS)
+            logger.warning("ASR worker %s exited with %s; restarting in %.1fs", index, process.exitcode, delay)
+            self._processes[index] = None
+            self._restart_at[index] = now + delay
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            if process is None:
+                continue
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+        for index in range(len(self._inflight)):
+            self._fail_inflight(index, RuntimeError("ASR worker pool closed"))
+        self._slab = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
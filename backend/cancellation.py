@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, List, Optional, Set
+
+from .metrics import Counter
+
+turns_cancelled = Counter("chat_turns_cancelled_total", "Chat/TTS work cancelled before it finished, by reason.", ("reason",))
+
+
+class CancelToken:
+    """Flag shared by everything working on one reply.
+
+    Long loops poll :attr:`cancelled`; blocking work (subprocesses) registers
+    a callback that tears it down, which runs immediately on :meth:`cancel`
+    from whichever thread cancels.
+    """
+
+    def __init__(self) -> None:
+        self.reason: Optional[str] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        with self._lock:
+            if self.reason is not None:
+                return False
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+        return True
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run ``callback`` on cancellation (now, if already cancelled); returns an unregister function."""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class TurnRegistry:
+    """Live cancel tokens per conversation session and per kiosk (device id).
+
+    A turn belongs to the chat session it answers and, when known, to the
+    device that will play it; the speech stream only knows the device, so
+    barge-in cancels by device.
+    """
+
+    def __init__(self) -> None:
+        self._active: Dict[str, Set[CancelToken]] = {}
+        self._devices: Dict[str, Set[CancelToken]] = {}
+        self._token_devices: Dict[CancelToken, str] = {}
+        self._lock = threading.Lock()
+
+    def open(self, session_id: Optional[str], supersede: bool = False, device_id: Optional[str] = None) -> CancelToken:
+        """Token for new work on ``session_id``; ``supersede`` cancels the session's older work first."""
+        if supersede and session_id:
+            self.cancel(session_id, "superseded")
+        token = CancelToken()
+        with self._lock:
+            if session_id:
+                self._active.setdefault(session_id, set()).add(token)
+            if device_id:
+                self._devices.setdefault(device_id, set()).add(token)
+                self._token_devices[token] = device_id
+        return token
+
+    def close(self, session_id: Optional[str], token: CancelToken) -> None:
+        with self._lock:
+            if session_id:
+                _discard(self._active, session_id, token)
+            device_id = self._token_devices.pop(token, None)
+            if device_id is not None:
+                _discard(self._devices, device_id, token)
+
+    def cancel(self, session_id: str, reason: str = "cancelled") -> int:
+        """Cancel all live work of a session; returns how many tokens were cancelled."""
+        with self._lock:
+            tokens = self._active.pop(session_id, set())
+        return _cancel_all(tokens, reason)
+
+    def cancel_device(self, device_id: str, reason: str = "cancelled") -> int:
+        """Cancel all live work that will play on ``device_id``, whatever its session."""
+        with self._lock:
+            tokens = self._devices.pop(device_id, set())
+            for token in tokens:
+                self._token_devices.pop(token, None)
+        return _cancel_all(tokens, reason)
+
+    def active(self, session_id: str) -> bool:
+        return bool(self._active.get(session_id))
+
+
+def _discard(index: Dict[str, Set[CancelToken]], key: str, token: CancelToken) -> None:
+    tokens = index.get(key)
+    if tokens is not None:
+        tokens.discard(token)
+        if not tokens:
+            del index[key]
+
+
+def _cancel_all(tokens: Set[CancelToken], reason: str) -> int:
+    cancelled = sum(1 for token in tokens if token.cancel(reason))
+    if cancelled:
+        turns_cancelled.labels(reason=reason).inc(cancelled)
+    return cancelled
+
+
+turns = TurnRegistry()
@@ -1,15 +1,40 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from .db import init_db
-from .routers import users, deliveries, meetings, chat, speech, tts
+from .routers import users, deliveries, meetings, chat, speech, tts, health, metrics
+
+# Opt-in: load and warm up heavy models at startup instead of on first use.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await speech.startup()
+    preload = []
+    if PRELOAD_MODELS:
+        # Runs in the background; /api/health/ready answers 503 until it is done.
+        preload = [
+            asyncio.create_task(health.preload_component("asr", speech.warm_up)),
+            asyncio.create_task(health.preload_component("tts", tts.warm_up, required=False)),
+        ]
+    try:
+        yield
+    finally:
+        for task in preload:
+            task.cancel()
+        await speech.shutdown()
 
 
 def create_app() -> FastAPI:
     init_db()
-    app = FastAPI(title="AI Concierge API (FastAPI)")
+    app = FastAPI(title="AI Concierge API (FastAPI)", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -26,6 +51,8 @@ def create_app() -> FastAPI:
     app.include_router(chat.router, prefix="/api", tags=["chat"])
     app.include_router(speech.router, prefix="/api", tags=["speech"])
     app.include_router(tts.router, prefix="/api", tags=["tts"])
+    app.include_router(health.router, prefix="/api", tags=["health"])
+    app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 
     # Serve static frontend (chat page as main entry)
     static_dir = Path(__file__).resolve().parents[1] / "frontend"
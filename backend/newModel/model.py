@@ -444,10 +444,100 @@ toolMap = {
 }
 
 
+def _complete(messages: List[Dict[str, Any]], cancel: Any = None) -> Optional[Dict[str, Any]]:
+    """One model turn as {"content", "tool_calls", "finish_reason"}.
+
+    With a cancel token the reply is streamed, and cancelling closes the
+    stream at once, even while waiting for the first token or on a stalled
+    read (closing it makes the server stop generating); returns None when
+    cancelled.
+    """
+    if cancel is None:
+        resp = client.chat.completions.create(
+            model=modelId,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            temperature=0.0,
+        )
+        choice = resp.choices[0]
+        msg = choice.message
+        tool_calls = [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {"name": tc.function.name, "arguments": tc.function.arguments},
+            }
+            for tc in (getattr(msg, "tool_calls", None) or [])
+        ]
+        return {
+            "content": getattr(msg, "content", None),
+            "tool_calls": tool_calls,
+            "finish_reason": choice.finish_reason,
+        }
+
+    if cancel.cancelled:
+        return None
+    stream = client.chat.completions.create(
+        model=modelId,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        temperature=0.0,
+        stream=True,
+    )
+    # Runs on the cancelling thread; the read below then fails or ends early.
+    unregister = cancel.on_cancel(stream.close)
+    content: List[str] = []
+    calls: Dict[int, Dict[str, Any]] = {}
+    finish_reason = None
+    try:
+        for chunk in stream:
+            if cancel.cancelled:
+                return None
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if getattr(delta, "content", None):
+                content.append(delta.content)
+            for tc in getattr(delta, "tool_calls", None) or []:
+                call = calls.setdefault(
+                    tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+                )
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function is not None:
+                    call["function"]["name"] += tc.function.name or ""
+                    call["function"]["arguments"] += tc.function.arguments or ""
+            finish_reason = choice.finish_reason or finish_reason
+    except Exception:
+        if cancel.cancelled:
+            return None
+        raise
+    finally:
+        unregister()
+        stream.close()
+    if cancel.cancelled:
+        return None
+    return {
+        "content": "".join(content) or None,
+        "tool_calls": [calls[index] for index in sorted(calls)],
+        "finish_reason": finish_reason,
+    }
+
+
 def runAgent(
     userInput: Dict[str, Any],
     history: Optional[List[Dict]] = None,
+    cancel: Any = None,
 ) -> Dict[str, Any]:
+    """Run the tool loop for one visitor message.
+
+    ``cancel`` is an optional token (see backend/cancellation.py); cancelling
+    it closes the model stream in flight, and the loop returns an empty reply
+    with ``cancelled`` true.
+    """
 
     user_text = ""
     if isinstance(userInput, dict):
@@ -496,8 +586,14 @@ def runAgent(
             "history_was_reset": history_reset_occurred,
             "history_reset_before_call": history_reset_before_call,
             "history_reset_during_call": history_reset_during_call,
+            "cancelled": False,
         }
 
+    def _cancelled() -> Dict[str, Any]:
+        result = _finalize("")
+        result["cancelled"] = True
+        return result
+
     recent = [] if reset_history else _normalize_history(history, max_pairs=8)
 
     try:
@@ -530,31 +626,26 @@ def runAgent(
                     last_text or "Üzgünüm, bir karar veremedim. Lütfen tekrar deneyiniz."
                 )
 
-            resp = client.chat.completions.create(
-                model=modelId,             
-                messages=messages,
-                tools=tools,
-                tool_choice="auto",
-                temperature=0.0,
-            )
-
-            choice = resp.choices[0]
-            msg = choice.message
+            if cancel is not None and cancel.cancelled:
+                return _cancelled()
+            msg = _complete(messages, cancel)
+            if msg is None:
+                return _cancelled()
 
             assistant_payload: Dict[str, Any] = {"role": "assistant"}
-            if getattr(msg, "content", None):
-                assistant_payload["content"] = msg.content
-                last_text = msg.content or last_text
-            if getattr(msg, "tool_calls", None):
-                assistant_payload["tool_calls"] = msg.tool_calls
+            if msg["content"]:
+                assistant_payload["content"] = msg["content"]
+                last_text = msg["content"] or last_text
+            if msg["tool_calls"]:
+                assistant_payload["tool_calls"] = msg["tool_calls"]
             messages.append(assistant_payload)
 
-            tool_calls = getattr(msg, "tool_calls", None)
+            tool_calls = msg["tool_calls"]
             if tool_calls:
                 for tc in tool_calls:
-                    name = tc.function.name
+                    name = tc["function"]["name"]
                     try:
-                        args = json.loads(tc.function.arguments or "{}")
+                        args = json.loads(tc["function"]["arguments"] or "{}")
                     except Exception:
                         args = {}
                     try:
@@ -570,17 +661,17 @@ def runAgent(
                     messages.append(
                         {
                             "role": "tool",
-                            "tool_call_id": tc.id,
+                            "tool_call_id": tc["id"],
                             "name": name,
                             "content": tool_content,
                         }
                     )
                 continue
 
-            if getattr(msg, "content", None):
-                return _finalize(msg.content or "")
+            if msg["content"]:
+                return _finalize(msg["content"] or "")
 
-            if choice.finish_reason in ("stop", "length", "content_filter"):
+            if msg["finish_reason"] in ("stop", "length", "content_filter"):
                 return _finalize(last_text or "")
 
     except (openai.APIConnectionError, Exception) as e:
@@ -28,8 +28,8 @@ def _prepare_history(history: list | None) -> List[Dict[str, str]]:
     return list(_agent_history)
 
 
-def talkToAgent(userText: str, isReset: bool, history: list | None = None) -> Dict[str, Any]:
-    agent_resp = runAgent({"text": userText}, history=_prepare_history(history))
+def talkToAgent(userText: str, isReset: bool, history: list | None = None, cancel: Any = None) -> Dict[str, Any]:
+    agent_resp = runAgent({"text": userText}, history=_prepare_history(history), cancel=cancel)
     if isReset:
         setHistoryResetFlag()
     if not isinstance(agent_resp, dict):
@@ -43,7 +43,9 @@ def talkToAgent(userText: str, isReset: bool, history: list | None = None) -> Di
 
         if not agent_resp.get("history_reset_during_call"):
             _append_history("user", userText)
-            _append_history("assistant", agent_resp.get("reply", ""))
+            # An interrupted reply was never heard, so only the visitor's words stay.
+            if not agent_resp.get("cancelled"):
+                _append_history("assistant", agent_resp.get("reply", ""))
 
     return agent_resp
 
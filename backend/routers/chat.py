@@ -6,8 +6,10 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 
 # Import the agent from the sibling package `model`
+from ..asr.playback import ogg_opus_duration, playback
+from ..cancellation import turns
 from ..newModel.talk import talkToAgent
-from .tts import synthesize_tts_bytes
+from .tts import OPUS_BITRATE, synthesize_tts_bytes
 
 
 router = APIRouter()
@@ -19,6 +21,11 @@ class ChatRequest(BaseModel):
     history: Optional[List[Dict[str, str]]] = None
     context: Optional[Dict[str, Any]] = None
     isReset: bool = False
+    # Kiosk that will play the reply, so its mic is not transcribed meanwhile.
+    deviceId: Optional[str] = None
+    # Conversation the turn belongs to: a newer turn, POST /chat/cancel or the
+    # visitor speaking (on a speech stream with this X-Device-Id) aborts it.
+    sessionId: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -28,11 +35,37 @@ class ChatResponse(BaseModel):
     historyCleared: bool = False
     audio: Optional[str] = None
     audioMimeType: Optional[str] = None
+    cancelled: bool = False
+
+
+class CancelRequest(BaseModel):
+    sessionId: str
+    # Kiosk whose playback window ends with the reply.
+    deviceId: Optional[str] = None
 
 
 @router.post("/chat", response_model=ChatResponse)
 def chat_endpoint(req: ChatRequest):
-    agent_resp = talkToAgent(req.message, req.isReset)
+    if not req.sessionId:
+        return _chat_turn(req, None)
+    token = turns.open(req.sessionId, supersede=True, device_id=req.deviceId)
+    try:
+        return _chat_turn(req, token)
+    finally:
+        turns.close(req.sessionId, token)
+
+
+@router.post("/chat/cancel")
+def cancel_chat(req: CancelRequest):
+    """Abort the session's running reply (LLM call and TTS) and end its playback window."""
+    cancelled = turns.cancel(req.sessionId, "client")
+    if req.deviceId:
+        playback.stop(req.deviceId)
+    return {"sessionId": req.sessionId, "cancelled": cancelled}
+
+
+def _chat_turn(req: ChatRequest, token):
+    agent_resp = talkToAgent(req.message, req.isReset, cancel=token)
     history: List[Dict[str, str]] = []
     if isinstance(agent_resp, dict):
         reply = str(agent_resp.get("reply", ""))
@@ -43,16 +76,21 @@ def chat_endpoint(req: ChatRequest):
         reply = str(agent_resp)
         cleared = False
 
+    if token is not None and token.cancelled:
+        return {"reply": "", "context": None, "history": history, "historyCleared": cleared, "cancelled": True}
+
     audio_b64: Optional[str] = None
     audio_mime = "audio/ogg"
     if reply.strip():
         try:
-            audio_bytes = synthesize_tts_bytes(reply)
+            audio_bytes = synthesize_tts_bytes(reply, token)
         except Exception:
             logger.exception("Failed to synthesize TTS audio")
         else:
             if audio_bytes:
                 audio_b64 = base64.b64encode(audio_bytes).decode("ascii")
+                if req.deviceId:
+                    playback.start(req.deviceId, ogg_opus_duration(audio_bytes, OPUS_BITRATE))
 
     return {
         "reply": reply,
@@ -61,4 +99,5 @@ def chat_endpoint(req: ChatRequest):
         "historyCleared": cleared,
         "audio": audio_b64,
         "audioMimeType": audio_mime if audio_b64 else None,
+        "cancelled": token is not None and token.cancelled,
     }
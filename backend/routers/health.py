@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ComponentStatus:
+    # Optional components are reported but do not hold back readiness.
+    required: bool = True
+    ready: bool = False
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+_components: Dict[str, ComponentStatus] = {}
+
+
+def register_component(name: str, required: bool = True) -> ComponentStatus:
+    status = _components.get(name)
+    if status is None:
+        status = ComponentStatus(required=required)
+        _components[name] = status
+    return status
+
+
+async def preload_component(name: str, loader: Callable[[], Awaitable[None]], required: bool = True) -> None:
+    """Run a component's load/warm-up coroutine and record how it went."""
+    status = register_component(name, required)
+    started = time.perf_counter()
+    try:
+        await loader()
+    except Exception as exc:
+        status.error = str(exc) or exc.__class__.__name__
+        logger.exception("Preloading %s failed", name)
+        return
+    status.load_seconds = round(time.perf_counter() - started, 3)
+    status.ready = True
+    status.error = None
+    logger.info("%s ready after %.1fs", name, status.load_seconds)
+
+
+def is_ready() -> bool:
+    return all(status.ready for status in _components.values() if status.required)
+
+
+@router.get("/health/ready")
+def readiness():
+    """Per-component readiness; 503 until every required component is warm."""
+    ready = is_ready()
+    payload = {
+        "ready": ready,
+        "components": {
+            name: {
+                "ready": status.ready,
+                "required": status.required,
+                "loadSeconds": status.load_seconds,
+                "error": status.error,
+            }
+            for name, status in _components.items()
+        },
+    }
+    return JSONResponse(payload, status_code=200 if ready else 503)
@@ -1,42 +1,283 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import logging
 import os
+import time
+import uuid
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
 import numpy as np
 import torch
-import whisper
-from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi import APIRouter, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from ..asr.backends import get_backend
+from ..asr.codec import StreamingAudioDecoder, container_for
+from ..asr.decoding import DecodeJob, Segment, n_mels_for
+from ..asr.features import HOP_LENGTH, LogMelStream
+from ..asr.models import ModelManager
+from ..asr.offline import pack_chunks, read_wav, speech_regions, transcribe_chunk
+from ..asr.playback import playback
+from ..asr.profiles import ProfileSelector
+from ..asr.recording import SpeechRecorder
+from ..asr.resample import StreamingResampler, resample
+from ..asr.ring_buffer import AudioRingBuffer
+from ..asr.scheduler import BatchScheduler
+from ..asr.sessions import SessionStore, sessions_evicted, sessions_expired
+from ..asr.vad import EnergyVad
+from ..asr.worker_pool import AsrWorkerPool, parse_core_sets
+from ..cancellation import turns
+from ..metrics import Counter, Histogram
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Configuration
 WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "large-v2")
+# Two-tier cascade: with WHISPER_PARTIAL_MODEL set (e.g. "base"), that small model
+# decodes the live interim chunks in-process, and WHISPER_MODEL only runs final
+# passes and re-decodes committed segments in the background.
+WHISPER_PARTIAL_MODEL_NAME = os.getenv("WHISPER_PARTIAL_MODEL", "")
+CASCADE_ENABLED = bool(WHISPER_PARTIAL_MODEL_NAME)
+# Profiles that go to the partial model when the cascade is on.
+PARTIAL_MODEL_PROFILES = ("partial", "streaming")
+# "reference" (stock Whisper) or "int8" (dynamically quantized, CPU only).
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "reference")
+_backend = get_backend(WHISPER_BACKEND)
 if "WHISPER_DEVICE" in os.environ:
-    WHISPER_DEVICE = os.environ["WHISPER_DEVICE"]
-elif torch.cuda.is_available():
+    WHISPER_DEVICE = _backend.resolve_device(os.environ["WHISPER_DEVICE"])
+elif torch.cuda.is_available() and _backend.supports_cuda:
     WHISPER_DEVICE = "cuda:1" if torch.cuda.device_count() > 1 else "cuda"
 else:
     WHISPER_DEVICE = "cpu"
 SESSION_TTL = timedelta(minutes=5)
 MAX_BUFFER_SECONDS = 30
 TARGET_SAMPLE_RATE = 16000
+# Decode jobs from concurrent sessions arriving within this window share one forward pass.
+BATCH_WINDOW_MS = float(os.getenv("WHISPER_BATCH_WINDOW_MS", "30"))
+MAX_BATCH_SIZE = int(os.getenv("WHISPER_MAX_BATCH", "8"))
+# With ASR_WORKERS > 0 Whisper runs in that many pinned worker processes instead
+# of the API process; ASR_WORKER_CORES optionally assigns cores ("0-7;8-15").
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "0"))
+ASR_WORKER_CORES = os.getenv("ASR_WORKER_CORES", "")
+# Beyond this many sessions the least recently used one is evicted.
+MAX_SESSIONS = int(os.getenv("SPEECH_MAX_SESSIONS", "256"))
+# Voice activity detection: silent chunks are not decoded, and an utterance is
+# finalized server-side after this much trailing silence (0 disables endpointing).
+VAD_ENABLED = os.getenv("SPEECH_VAD", "1").lower() not in ("0", "false", "no")
+ENDPOINT_SILENCE_SECONDS = float(os.getenv("SPEECH_ENDPOINT_SILENCE_MS", "1000")) / 1000.0
+VAD_MIN_SPEECH_FRAMES = 3
+VAD_PREROLL_SECONDS = 0.3
+VAD_HANGOVER_SECONDS = 0.3
+# Default per-request latency budget (0 = none); X-Latency-Budget-Ms overrides it.
+# With a budget, decodes are downgraded to cheaper profiles when they would not fit.
+DEFAULT_LATENCY_BUDGET_MS = float(os.getenv("SPEECH_LATENCY_BUDGET_MS", "0"))
+# Directory whose files /speech/transcribe may read by path; unset disables paths.
+TRANSCRIBE_ROOT = os.getenv("SPEECH_TRANSCRIBE_ROOT", "")
+# When set, every /speech/stream session is recorded there for src/replay_speech.py.
+RECORD_DIR = os.getenv("SPEECH_RECORD_DIR", "")
+# In-process models idle this long are unloaded, or with WHISPER_IDLE_ACTION=downcast
+# parked on the CPU in fp16; the next session brings them back in the background.
+MODEL_IDLE_SECONDS = float(os.getenv("WHISPER_IDLE_UNLOAD_MINUTES", "0")) * 60.0
+MODEL_IDLE_ACTION = os.getenv("WHISPER_IDLE_ACTION", "unload")
+# While a kiosk plays our own TTS reply its mic hears it: "mute" skips ASR for that
+# audio unless the VAD, with its margin raised by PLAYBACK_DUCK_DB, hears a visitor
+# talking over the reply (a barge-in); "duck" transcribes with that raised margin
+# throughout; "off" ignores playback.
+PLAYBACK_MODE = os.getenv("SPEECH_PLAYBACK_MODE", "mute")
+PLAYBACK_DUCK_DB = float(os.getenv("SPEECH_PLAYBACK_DUCK_DB", "12"))
+# Upper bound on the in-process models' weights (0 = none); idle models make room first.
+MODEL_MEMORY_BUDGET_BYTES = int(float(os.getenv("WHISPER_MEMORY_BUDGET_MB", "0")) * 2**20)
+
+# Session features are computed for the model that decodes interim chunks.
+N_MELS = n_mels_for(WHISPER_PARTIAL_MODEL_NAME or WHISPER_MODEL_NAME)
+
+_ASR_LABELS = ("model", "device")
+queue_wait_seconds = Histogram(
+    "speech_queue_wait_seconds",
+    "Time a decode job waits in the batch scheduler before its batch starts.",
+    _ASR_LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+decode_seconds = Histogram(
+    "speech_decode_seconds",
+    "Wall time of one batched Whisper decode.",
+    _ASR_LABELS,
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0),
+)
+decode_batch_size = Histogram(
+    "speech_decode_batch_size", "Decode jobs per batch.", _ASR_LABELS, buckets=(1, 2, 4, 8, 16, 32)
+)
+real_time_factor = Histogram(
+    "speech_real_time_factor",
+    "Batch decode time divided by the job's audio window length.",
+    _ASR_LABELS,
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0),
+)
+window_seconds = Histogram(
+    "speech_decode_window_seconds",
+    "Length of the audio window sent to the decoder.",
+    _ASR_LABELS,
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0),
+)
+playback_suppressed_seconds = Counter(
+    "speech_playback_suppressed_seconds_total", "Mic audio not transcribed because the kiosk was playing TTS."
+)
+_metric_labels = {"model": WHISPER_MODEL_NAME, "device": WHISPER_DEVICE}
+_partial_metric_labels = {"model": WHISPER_PARTIAL_MODEL_NAME, "device": WHISPER_DEVICE}
 
-_sessions: Dict[str, "SessionState"] = {}
-_sessions_lock = asyncio.Lock()
-_model_lock = asyncio.Lock()
-_model = None
+_recorder = SpeechRecorder(RECORD_DIR) if RECORD_DIR else None
+_worker_pool: Optional[AsrWorkerPool] = None
+_models = ModelManager(MODEL_MEMORY_BUDGET_BYTES, MODEL_IDLE_SECONDS, MODEL_IDLE_ACTION)
+_model_sweeper: Optional["asyncio.Task[None]"] = None
+for _name in {WHISPER_MODEL_NAME, WHISPER_PARTIAL_MODEL_NAME} - {""}:
+    _models.register(
+        _name,
+        lambda name=_name: _backend.load(name, WHISPER_DEVICE),
+        WHISPER_DEVICE,
+        can_downcast=_backend.supports_downcast,
+    )
 
 
 @dataclass
 class SessionState:
-    audio_buffer: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    # ``audio`` and ``features`` grow as speech arrives, to about 5.8 MB for a
+    # full 30 s window; an idle session holds neither.
+    audio: AudioRingBuffer = field(
+        default_factory=lambda: AudioRingBuffer(TARGET_SAMPLE_RATE * MAX_BUFFER_SECONDS)
+    )
     last_text: str = ""
     sample_rate: int = TARGET_SAMPLE_RATE
     last_updated: datetime = field(default_factory=datetime.utcnow)
+    # Text whose audio has already been dropped from ``audio_buffer``, one
+    # entry per commit so the cascade can swap in the large model's text.
+    committed_parts: List[str] = field(default_factory=list)
+    # Segments of the previous decode, relative to the start of ``audio_buffer``.
+    pending_segments: List[Segment] = field(default_factory=list)
+    vad: EnergyVad = field(default_factory=EnergyVad)
+    has_speech: bool = False
+    trailing_silence: float = 0.0
+    resampler: Optional[StreamingResampler] = None
+    # Opus uploads (Ogg or WebM) are one container stream per session, decoded by one process.
+    decoder: Optional[StreamingAudioDecoder] = None
+    # WebSocket sessions live as long as their socket and are never expired.
+    socket_bound: bool = False
+    # Kiosk the audio comes from, to match it with TTS playback on that kiosk.
+    device_id: Optional[str] = None
+    # Log-mel frames of ``audio``, extended as chunks arrive so decodes skip the STFT.
+    features: LogMelStream = field(default_factory=lambda: LogMelStream(N_MELS))
+    # Cascade: committed audio waiting for, and tasks running, the large-model re-decode.
+    refine_commits: bool = field(default_factory=lambda: CASCADE_ENABLED)
+    refinements_due: List[Tuple[int, np.ndarray, str]] = field(default_factory=list)
+    refinement_tasks: List["asyncio.Task[None]"] = field(default_factory=list)
+    # Bumped on every reset so late refinements of a finished utterance are dropped.
+    utterance_id: int = 0
+    # Running totals for the summary logged when the session goes away.
+    created: datetime = field(default_factory=datetime.utcnow)
+    audio_seconds: float = 0.0
+    utterances: int = 0
+    decodes: int = 0
+    decode_seconds: float = 0.0
+    queue_seconds: float = 0.0
+
+    def resample(self, audio: np.ndarray, sample_rate: int, finish: bool = False) -> np.ndarray:
+        """Resample a chunk to 16 kHz, keeping filter state across the session's chunks.
+
+        ``finish`` ends the stream: the last few milliseconds the filter held
+        back for lack of future input are appended, and the next chunk starts
+        a fresh filter.
+        """
+        parts = []
+        if self.resampler is not None and self.resampler.orig_sr != sample_rate:
+            parts.append(self.resampler.flush())
+            self.resampler = None
+        if self.resampler is None:
+            self.resampler = StreamingResampler(sample_rate, TARGET_SAMPLE_RATE)
+            self.sample_rate = sample_rate
+        parts.append(self.resampler.process(audio))
+        if finish:
+            parts.append(self.resampler.flush())
+            self.resampler = None
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    async def decode_upload(self, data: bytes, container: str, finish: bool) -> np.ndarray:
+        """Decode the next piece of a compressed upload to 16 kHz float32.
+
+        ``finish`` ends the container stream and returns the decoder's tail;
+        the next upload must then start a new stream (with its own header).
+        """
+        if self.decoder is None or self.decoder.container != container:
+            self.close_decoder()
+            self.decoder = StreamingAudioDecoder(container)
+        decoder = self.decoder
+        parts = [await decoder.decode(data)] if data else []
+        if finish:
+            parts.append(await decoder.flush())
+            self.close_decoder()
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+    def close_decoder(self) -> None:
+        if self.decoder is not None:
+            self.decoder.close()
+            self.decoder = None
+
+    def feed(self, chunk: np.ndarray, flags: Optional[np.ndarray] = None) -> bool:
+        """Append chunk through the VAD; return whether it contains speech.
+
+        ``flags`` are the chunk's VAD frame flags when the caller already ran the VAD on it.
+        """
+        if flags is None:
+            flags = self.vad.speech_frames(chunk)
+        speech_frames = np.flatnonzero(flags)
+        contains_speech = bool(speech_frames.size >= VAD_MIN_SPEECH_FRAMES)
+        if contains_speech:
+            self.has_speech = True
+            self.trailing_silence = float(flags.size - speech_frames[-1] - 1) * self.vad.frame_seconds
+        else:
+            self.trailing_silence += chunk.size / TARGET_SAMPLE_RATE
+        self.append_audio(chunk)
+        if not self.has_speech:
+            # Leading silence: keep only a short pre-roll so word onsets survive.
+            excess = self.audio.size - int(VAD_PREROLL_SECONDS * TARGET_SAMPLE_RATE)
+            if excess > 0:
+                self._drop_front(excess - excess % HOP_LENGTH)
+        return contains_speech
+
+    def speech_window(self) -> np.ndarray:
+        """Return the active window without trailing silence beyond the hangover."""
+        silence = max(self.trailing_silence - VAD_HANGOVER_SECONDS, 0.0)
+        return self.audio.view(max(self.audio.size - int(silence * TARGET_SAMPLE_RATE), 0))
+
+    def decode_job(self, profile: str) -> DecodeJob:
+        """Decode job for the speech window, with its log-mel input precomputed."""
+        window = self.speech_window()
+        return DecodeJob(window, self.committed_text, mel=self.features.decoder_input(window), profile=profile)
+
+    @property
+    def endpoint_reached(self) -> bool:
+        return (
+            ENDPOINT_SILENCE_SECONDS > 0
+            and self.has_speech
+            and self.trailing_silence >= ENDPOINT_SILENCE_SECONDS
+        )
+
+    def reset_utterance(self) -> None:
+        """Start a new utterance on the same session, keeping the VAD noise floor."""
+        self.audio.clear()
+        self.features.clear()
+        self.last_text = ""
+        self.committed_parts = []
+        self.refinements_due = []
+        self.refinement_tasks = []
+        self.utterance_id += 1
+        self.pending_segments = []
+        self.has_speech = False
+        self.trailing_silence = 0.0
 
     def append_audio(self, chunk: np.ndarray) -> None:
         """Append chunk and trim to the most recent window."""
@@ -44,118 +285,756 @@ class SessionState:
             raise ValueError("chunk must be np.float32")
         if chunk.size == 0:
             return
-        self.audio_buffer = np.concatenate((self.audio_buffer, chunk))
-        max_samples = TARGET_SAMPLE_RATE * MAX_BUFFER_SECONDS
-        if self.audio_buffer.size > max_samples:
-            self.audio_buffer = self.audio_buffer[-max_samples:]
+        overflow = chunk.size - self.audio.free
+        if overflow > 0:
+            # Commit whatever the window is about to lose instead of dropping its text.
+            overflow_seconds = overflow / TARGET_SAMPLE_RATE
+            self._commit(sum(1 for seg in self.pending_segments if seg.start < overflow_seconds))
+            overflow = chunk.size - self.audio.free
+            if overflow > 0:
+                # Drop whole hops so cached log-mel frames stay aligned with the window.
+                self._drop_front(min(-(-overflow // HOP_LENGTH) * HOP_LENGTH, self.audio.size))
+                self.pending_segments = []
+        if self.audio.append(chunk):
+            self.features.clear()
+            self.pending_segments = []
+        self.features.extend(self.audio.view())
         self.last_updated = datetime.utcnow()
 
+    def _drop_front(self, count: int) -> None:
+        self.audio.consume(count)
+        self.features.drop_front(count)
 
-def _get_model():
-    global _model
-    if _model is None:
-        _model = whisper.load_model(WHISPER_MODEL_NAME, device=WHISPER_DEVICE)
-    return _model
+    @property
+    def audio_buffer(self) -> np.ndarray:
+        """Zero-copy view of the active window."""
+        return self.audio.view()
 
+    @property
+    def memory_bytes(self) -> int:
+        resampler_bytes = self.resampler.memory_bytes if self.resampler is not None else 0
+        decoder_bytes = self.decoder.memory_bytes if self.decoder is not None else 0
+        return (
+            self.audio.nbytes
+            + self.features.memory_bytes
+            + self.vad.memory_bytes
+            + resampler_bytes
+            + decoder_bytes
+        )
 
-def _resample_to_16k(audio: np.ndarray, orig_sr: int) -> np.ndarray:
-    if orig_sr == TARGET_SAMPLE_RATE:
-        return audio.astype(np.float32, copy=False)
-    if orig_sr <= 0:
-        raise ValueError("sample rate must be positive")
-    new_len = int(round(audio.shape[0] * TARGET_SAMPLE_RATE / float(orig_sr)))
-    if new_len <= 0:
-        return np.zeros(0, dtype=np.float32)
-    return np.interp(
-        np.linspace(0.0, 1.0, num=new_len, endpoint=False),
-        np.linspace(0.0, 1.0, num=audio.shape[0], endpoint=False),
-        audio.astype(np.float32),
-    ).astype(np.float32)
+    @property
+    def committed_text(self) -> str:
+        return _join_text(self.committed_parts)
 
+    @property
+    def transcript(self) -> str:
+        return _join_text([self.committed_text] + [seg.text for seg in self.pending_segments])
 
-async def _transcribe_audio(buffer: np.ndarray) -> str:
-    model = _get_model()
-    if buffer.size == 0:
-        return ""
+    def apply_decode(self, segments: List[Segment], refine: bool = True) -> None:
+        """Commit the segments that two consecutive decodes agree on.
+
+        The last segment is always kept tentative because more audio may still
+        extend it.  Committed audio is dropped from the active window so the
+        next decode only covers the uncommitted tail.  With ``refine`` (and
+        the cascade on) committed audio is queued for a large-model re-decode.
+        """
+        stable = 0
+        for previous, current in zip(self.pending_segments, segments[:-1]):
+            if previous.text != current.text:
+                break
+            stable += 1
+        self.pending_segments = segments
+        self._commit(stable, refine)
+
+    def _commit(self, count: int, refine: bool = True) -> None:
+        if count <= 0:
+            return
+        committed = self.pending_segments[:count]
+        # Segment ends fall on 20 ms steps, i.e. whole hops, so the cut keeps
+        # the log-mel frames aligned.
+        hops = int(round(committed[-1].end * TARGET_SAMPLE_RATE / HOP_LENGTH))
+        cut = min(hops * HOP_LENGTH, self.audio.size - self.audio.size % HOP_LENGTH)
+        cut_seconds = cut / TARGET_SAMPLE_RATE
+        if refine and self.refine_commits and cut > 0:
+            self.refinements_due.append((len(self.committed_parts), self.audio.view(cut).copy(), self.committed_text))
+        self.committed_parts.append(_join_text([seg.text for seg in committed]))
+        self._drop_front(cut)
+        self.pending_segments = [
+            Segment(max(seg.start - cut_seconds, 0.0), max(seg.end - cut_seconds, 0.0), seg.text)
+            for seg in self.pending_segments[count:]
+        ]
+
+
+def _join_text(parts: List[str]) -> str:
+    return " ".join(part.strip() for part in parts if part and part.strip())
+
+
+def _decode_in_process(model_name: str, jobs: List[DecodeJob]) -> List[List[Segment]]:
+    with _models.use(model_name) as model:
+        return _backend.decode(model, jobs)
+
+
+def _prefetch_models() -> None:
+    """Mark the streaming models as active, reloading any that idled out."""
+    if _worker_pool is None:
+        _models.prefetch(WHISPER_MODEL_NAME)
+    if CASCADE_ENABLED:
+        _models.prefetch(WHISPER_PARTIAL_MODEL_NAME)
+
+
+def _timed_decode(jobs: List[DecodeJob], labels: Dict[str, str], run) -> List[List[Segment]]:
+    started = time.perf_counter()
+    for job in jobs:
+        job.queue_seconds = started - job.submitted_at if job.submitted_at else 0.0
+        queue_wait_seconds.labels(**labels).observe(job.queue_seconds)
+    decode_batch_size.labels(**labels).observe(len(jobs))
+
+    results = run(jobs)
+
+    elapsed = time.perf_counter() - started
+    decode_seconds.labels(**labels).observe(elapsed)
+    for job in jobs:
+        job.decode_seconds = elapsed
+        window_seconds.labels(**labels).observe(job.seconds)
+        if job.seconds > 0:
+            real_time_factor.labels(**labels).observe(elapsed / job.seconds)
+    return results
+
+
+def _decode_batch(jobs: List[DecodeJob]) -> List[List[Segment]]:
+    if _worker_pool is not None:
+        return _timed_decode(jobs, _metric_labels, _worker_pool.run_batch)
+    return _timed_decode(jobs, _metric_labels, lambda batch: _decode_in_process(WHISPER_MODEL_NAME, batch))
 
-    loop = asyncio.get_running_loop()
 
-    def _run() -> str:
-        result = model.transcribe(
-            buffer,
-            fp16=getattr(model, "device", torch.device("cpu")).type == "cuda",
-            language="tr",         
-            task="transcribe",      
+def _decode_partial_batch(jobs: List[DecodeJob]) -> List[List[Segment]]:
+    return _timed_decode(
+        jobs, _partial_metric_labels, lambda batch: _decode_in_process(WHISPER_PARTIAL_MODEL_NAME, batch)
+    )
+
+
+_scheduler: BatchScheduler[DecodeJob, List[Segment]] = BatchScheduler(
+    _decode_batch, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE, concurrency=max(ASR_WORKERS, 1)
+)
+# The small cascade model always runs in-process, next to (not behind) the large one.
+_partial_scheduler: BatchScheduler[DecodeJob, List[Segment]] = BatchScheduler(
+    _decode_partial_batch, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE
+)
+_profiles = ProfileSelector()
+
+
+async def startup() -> None:
+    global _worker_pool, _model_sweeper
+    _sessions.start()
+    if MODEL_IDLE_SECONDS > 0 and _model_sweeper is None:
+        _model_sweeper = asyncio.create_task(_sweep_models())
+    if ASR_WORKERS > 0 and _worker_pool is None:
+        core_sets = parse_core_sets(ASR_WORKER_CORES) if ASR_WORKER_CORES else None
+        pool = AsrWorkerPool(
+            ASR_WORKERS, WHISPER_MODEL_NAME, WHISPER_DEVICE, MAX_BATCH_SIZE, core_sets, backend=WHISPER_BACKEND
         )
+        pool.start()
+        _worker_pool = pool
+
+
+async def warm_up() -> None:
+    """Load the ASR model(s) and run one decode each on synthetic audio.
+
+    The decodes go through the schedulers so they never overlap a real request
+    on the same model, and pay the one-time allocation costs up front.
+    """
+    loop = asyncio.get_running_loop()
+    if _worker_pool is not None:
+        if not await loop.run_in_executor(None, _worker_pool.wait_ready):
+            raise RuntimeError("ASR workers did not finish loading in time")
+    else:
+        await loop.run_in_executor(None, _models.get, WHISPER_MODEL_NAME)
+    noise = 0.01 * np.random.default_rng(0).standard_normal(TARGET_SAMPLE_RATE).astype(np.float32)
+    await _scheduler.submit(DecodeJob(noise))
+    if CASCADE_ENABLED:
+        await loop.run_in_executor(None, _models.get, WHISPER_PARTIAL_MODEL_NAME)
+        await _partial_scheduler.submit(DecodeJob(noise))
+
+
+async def _sweep_models() -> None:
+    loop = asyncio.get_running_loop()
+    interval = min(max(MODEL_IDLE_SECONDS / 4, 1.0), 60.0)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, _models.sweep)
+        except Exception:
+            logger.exception("idle model sweep failed")
+
+
+async def shutdown() -> None:
+    global _worker_pool, _model_sweeper
+    await _sessions.stop()
+    if _model_sweeper is not None:
+        _model_sweeper.cancel()
+        try:
+            await _model_sweeper
+        except asyncio.CancelledError:
+            pass
+        _model_sweeper = None
+    await _scheduler.close()
+    await _partial_scheduler.close()
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool = None
+    if _recorder is not None:
+        await asyncio.get_running_loop().run_in_executor(None, _recorder.stop)
+
+
+def _scheduler_for(profile: str) -> BatchScheduler[DecodeJob, List[Segment]]:
+    if CASCADE_ENABLED and profile in PARTIAL_MODEL_PROFILES:
+        return _partial_scheduler
+    return _scheduler
+
+
+async def _transcribe_audio(job: DecodeJob) -> List[Segment]:
+    if job.audio.size == 0:
+        return []
+    scheduler = _scheduler_for(job.profile)
+    job.submitted_at = time.perf_counter()
+    # The scheduler serialises model access, so no separate model lock is needed.
+    segments = await scheduler.submit(job)
+    # decode_seconds runs from the batch's dispatch to its completion, so
+    # time spent queued is never counted as the profile's service time.
+    _profiles.observe(job.profile, job.decode_seconds, job.seconds)
+    return segments
+
+
+def _select_profile(is_final: bool, budget_ms: Optional[float], window_seconds: float) -> str:
+    requested = "final" if is_final else "streaming"
+    budget_ms = budget_ms if budget_ms is not None else DEFAULT_LATENCY_BUDGET_MS
+    if budget_ms <= 0:
+        return requested
+    queued_batches = -(-_scheduler_for(requested).pending // (MAX_BATCH_SIZE * max(ASR_WORKERS, 1)))
+    return _profiles.choose(requested, budget_ms / 1000.0, window_seconds, queued_batches)
+
+
+def _start_refinements(session: SessionState) -> None:
+    """Re-decode newly committed audio with the large model in the background."""
+    session.refinement_tasks = [task for task in session.refinement_tasks if not task.done()]
+    for index, audio, prompt in session.refinements_due:
+        task = asyncio.create_task(_refine_commit(session, session.utterance_id, index, audio, prompt))
+        session.refinement_tasks.append(task)
+    session.refinements_due = []
+
+
+async def _refine_commit(session: SessionState, utterance_id: int, index: int, audio: np.ndarray, prompt: str) -> None:
+    try:
+        segments = await _transcribe_audio(DecodeJob(audio, prompt, profile="final"))
+    except Exception:
+        # The partial model's text stays in place.
+        logger.exception("Refining a committed speech segment failed")
+        return
+    if session.utterance_id == utterance_id and index < len(session.committed_parts):
+        session.committed_parts[index] = _join_text([seg.text for seg in segments])
+
+
+def _on_session_removed(session_id: str, session: SessionState, reason: str) -> None:
+    session.close_decoder()
+    # A finalized session's last chunk is still to be recorded; stream_speech closes it.
+    if _recorder is not None and reason != "finalized":
+        _recorder.close(session_id)
+    _log_session_summary(session_id, session, reason)
+
+
+def _log_session_summary(session_id: str, session: SessionState, reason: str) -> None:
+    lifetime = (datetime.utcnow() - session.created).total_seconds()
+    rtf = session.decode_seconds / session.audio_seconds if session.audio_seconds else 0.0
+    mean_wait = session.queue_seconds / session.decodes if session.decodes else 0.0
+    logger.info(
+        "speech session %s %s after %.0fs: %d utterances, %.1fs audio, %d decodes, "
+        "%.2fs decoding (RTF %.2f), mean queue wait %.3fs",
+        session_id,
+        reason,
+        lifetime,
+        session.utterances,
+        session.audio_seconds,
+        session.decodes,
+        session.decode_seconds,
+        rtf,
+        mean_wait,
+    )
+
+
+_sessions: SessionStore[SessionState] = SessionStore(
+    SessionState, SESSION_TTL, MAX_SESSIONS, on_remove=_on_session_removed
+)
+
 
-        return result.get("text", "").strip()
+async def _get_session(session_id: str, device_id: Optional[str] = None) -> SessionState:
+    _prefetch_models()
+    session = _sessions.get(session_id)
+    if device_id:
+        session.device_id = device_id
+    return session
 
-    async with _model_lock:
-        return await loop.run_in_executor(None, _run)
 
+async def _remove_session(session_id: str, reason: str = "closed") -> None:
+    _sessions.remove(session_id, reason)
 
-async def _get_session(session_id: str) -> SessionState:
-    async with _sessions_lock:
-        state = _sessions.get(session_id)
-        if state is None:
-            state = SessionState()
-            _sessions[session_id] = state
-        return state
 
+@router.get("/speech/sessions")
+async def list_speech_sessions():
+    """Per-session buffer usage, for sizing hosts for N concurrent kiosks."""
+    items = list(_sessions.items())
+    sessions = [
+        {
+            "id": sid,
+            "memoryBytes": state.memory_bytes,
+            "bufferedSeconds": state.audio.size / TARGET_SAMPLE_RATE,
+            "lastUpdated": state.last_updated.isoformat(),
+        }
+        for sid, state in items
+    ]
+    return {
+        "count": len(sessions),
+        "totalMemoryBytes": sum(item["memoryBytes"] for item in sessions),
+        "expired": sessions_expired.value,
+        "evicted": sessions_evicted.value,
+        "sessions": sessions,
+    }
 
-async def _remove_session(session_id: str) -> None:
-    async with _sessions_lock:
-        _sessions.pop(session_id, None)
 
+@router.get("/speech/models")
+async def list_speech_models():
+    """Resident size and idle time of each in-process ASR model."""
+    models = _models.stats()
+    return {
+        "budgetBytes": _models.budget_bytes,
+        "idleSeconds": _models.idle_seconds,
+        "idleAction": _models.idle_action,
+        "totalResidentBytes": _models.total_bytes,
+        "workerProcesses": ASR_WORKERS,
+        "models": models,
+    }
 
-async def _cleanup_sessions() -> None:
-    now = datetime.utcnow()
-    async with _sessions_lock:
-        expired = [sid for sid, state in _sessions.items() if now - state.last_updated > SESSION_TTL]
-        for sid in expired:
-            _sessions.pop(sid, None)
+
+class PlaybackSignal(BaseModel):
+    deviceId: str
+    state: Literal["start", "stop"]
+    durationSeconds: Optional[float] = None
+
+
+@router.post("/speech/playback")
+async def signal_playback(signal: PlaybackSignal):
+    """Client-reported TTS playback; overrides the server's duration estimate."""
+    if signal.state == "start":
+        playback.start(signal.deviceId, signal.durationSeconds)
+    else:
+        playback.stop(signal.deviceId)
+    return {"deviceId": signal.deviceId, "playing": playback.playing(signal.deviceId)}
 
 
 @router.post("/speech/stream")
 async def stream_speech(
     request: Request,
     session_id: str = Header(..., alias="X-Session-Id"),
-    sample_rate: int = Header(..., alias="X-Sample-Rate"),
+    sample_rate: Optional[int] = Header(None, alias="X-Sample-Rate"),
     finalize: bool = Header(False, alias="X-Finalize"),
+    latency_budget_ms: Optional[float] = Header(None, alias="X-Latency-Budget-Ms"),
+    device_id: Optional[str] = Header(None, alias="X-Device-Id"),
 ):
+    """Transcribe the next chunk of a session's audio.
+
+    The body is 16-bit mono PCM at ``X-Sample-Rate`` by default, or a piece of
+    one continuous Opus stream when the Content-Type is ``audio/ogg`` or
+    ``audio/webm`` (what browsers' MediaRecorder emits).
+    """
+    arrived_at = time.monotonic()
     raw = await request.body()
+    content_type = request.headers.get("content-type", "")
+    result = await _stream_chunk(session_id, raw, content_type, sample_rate, finalize, latency_budget_ms, device_id)
+    if _recorder is not None:
+        _recorder.record(
+            session_id, arrived_at, raw, sample_rate, content_type, finalize, result["text"], result["is_final"]
+        )
+        if finalize:
+            _recorder.close(session_id)
+    return result
+
+
+async def _stream_chunk(
+    session_id: str,
+    raw: bytes,
+    content_type: str,
+    sample_rate: Optional[int],
+    finalize: bool,
+    latency_budget_ms: Optional[float],
+    device_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    container = container_for(content_type)
+    if latency_budget_ms is not None and latency_budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="latency budget must be positive")
+    if container is not None:
+        session = await _get_session(session_id, device_id)
+        try:
+            audio = await session.decode_upload(raw, container, finish=finalize)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=415, detail="Compressed audio needs ffmpeg on the server") from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        result = await _process_audio(session, audio, TARGET_SAMPLE_RATE, finalize, latency_budget_ms)
+        if finalize:
+            await _remove_session(session_id, "finalized")
+        return result
     if not raw:
-        session = await _get_session(session_id)
+        session = await _get_session(session_id, device_id)
         text = session.last_text
+        if finalize and session.refinement_tasks:
+            await asyncio.gather(*session.refinement_tasks, return_exceptions=True)
+            text = session.transcript
         if finalize:
-            await _remove_session(session_id)
-        else:
-            await _cleanup_sessions()
-        return {"text": text, "delta": "", "is_final": bool(finalize)}
-    if len(raw) % 2 != 0:
-        raise HTTPException(status_code=400, detail="Audio payload must be 16-bit PCM")
-
+            if text:
+                session.utterances += 1
+            await _remove_session(session_id, "finalized")
+        return {
+            "text": text,
+            "delta": "",
+            "is_final": bool(finalize),
+            "profile": None,
+            "playback": False,
+            "barge_in": False,
+        }
     try:
-        pcm16 = np.frombuffer(raw, dtype=np.int16)
+        audio = _pcm16_to_float(raw)
     except ValueError as exc:
-        raise HTTPException(status_code=400, detail="Invalid audio payload") from exc
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if sample_rate is None:
+        raise HTTPException(status_code=400, detail="Raw PCM uploads need an X-Sample-Rate header")
+    if sample_rate <= 0:
+        raise HTTPException(status_code=400, detail="sample rate must be positive")
+
+    session = await _get_session(session_id, device_id)
+    result = await _process_audio(session, audio, sample_rate, finalize, latency_budget_ms)
+
+    if finalize:
+        await _remove_session(session_id, "finalized")
+
+    return result
+
+
+@router.post("/speech/transcribe")
+async def transcribe_recording(
+    request: Request,
+    sample_rate: Optional[int] = Header(None, alias="X-Sample-Rate"),
+):
+    """Transcribe recorded audio much faster than real time.
+
+    The body is a 16-bit PCM WAV file, raw 16-bit mono PCM (with
+    ``X-Sample-Rate``), or JSON ``{"path": ...}`` naming a WAV file under
+    ``SPEECH_TRANSCRIBE_ROOT``.  The audio is split on silence, packed into
+    30 s windows and decoded in parallel batches.  The response is NDJSON:
+    one ``{"start", "end", "text"}`` line per segment, in order, each sent as
+    soon as it and everything before it is decoded, then a summary line.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "application/json":
+        try:
+            body = await request.json()
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail="Invalid JSON body") from exc
+        path = body.get("path") if isinstance(body, dict) else None
+        if not isinstance(path, str) or not path:
+            raise HTTPException(status_code=400, detail="JSON body must contain a 'path'")
+        raw = await asyncio.get_running_loop().run_in_executor(None, _read_server_file, path)
+        content_type = "audio/wav"
+    else:
+        raw = await request.body()
+    if not raw:
+        raise HTTPException(status_code=400, detail="Empty audio payload")
 
-    audio = pcm16.astype(np.float32) / 32768.0
     try:
-        audio = _resample_to_16k(audio, sample_rate)
+        if content_type in ("audio/wav", "audio/x-wav", "audio/wave") or raw[:4] == b"RIFF":
+            audio, sample_rate = read_wav(raw)
+        elif sample_rate is None:
+            raise ValueError("Raw PCM uploads need an X-Sample-Rate header")
+        else:
+            audio = _pcm16_to_float(raw)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if sample_rate <= 0:
+        raise HTTPException(status_code=400, detail="sample rate must be positive")
+
+    loop = asyncio.get_running_loop()
+    if sample_rate != TARGET_SAMPLE_RATE:
+        audio = await loop.run_in_executor(None, resample, audio, sample_rate)
+    chunks = pack_chunks(await loop.run_in_executor(None, speech_regions, audio))
+    return StreamingResponse(_transcribe_chunks(audio, chunks), media_type="application/x-ndjson")
+
+
+def _read_server_file(path: str) -> bytes:
+    if not TRANSCRIBE_ROOT:
+        raise HTTPException(status_code=403, detail="Server-side paths are disabled (set SPEECH_TRANSCRIBE_ROOT)")
+    root = os.path.realpath(TRANSCRIBE_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=403, detail="Path is outside SPEECH_TRANSCRIBE_ROOT")
+    try:
+        with open(resolved, "rb") as handle:
+            return handle.read()
+    except OSError as exc:
+        raise HTTPException(status_code=404, detail=f"Cannot read {path}") from exc
+
+
+async def _transcribe_chunks(audio: np.ndarray, chunks: List[Tuple[int, int]]):
+    started = time.perf_counter()
+    # Enough jobs in flight to fill every batch slot, without flooding the
+    # scheduler so far that live sessions queue behind a whole recording.
+    limit = asyncio.Semaphore(MAX_BATCH_SIZE * max(ASR_WORKERS, 1))
 
-    session = await _get_session(session_id)
-    session.append_audio(audio)
+    async def _decode_window(window: np.ndarray) -> List[Segment]:
+        async with limit:
+            return await _transcribe_audio(DecodeJob(window, profile="offline"))
 
-    text = await _transcribe_audio(session.audio_buffer)
+    async def _decode(start: int, end: int) -> List[Segment]:
+        return await transcribe_chunk(_decode_window, audio, start, end)
+
+    tasks = [asyncio.create_task(_decode(start, end)) for start, end in chunks]
+    count = 0
+    try:
+        for (start, _), task in zip(chunks, tasks):
+            offset = start / TARGET_SAMPLE_RATE
+            for segment in await task:
+                count += 1
+                line = {
+                    "start": round(offset + segment.start, 2),
+                    "end": round(offset + segment.end, 2),
+                    "text": segment.text,
+                }
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.perf_counter() - started
+    duration = audio.size / TARGET_SAMPLE_RATE
+    summary = {
+        "done": True,
+        "duration": round(duration, 2),
+        "segments": count,
+        "chunks": len(chunks),
+        "elapsedSeconds": round(elapsed, 3),
+        "realTimeFactor": round(elapsed / duration, 4) if duration else 0.0,
+    }
+    yield json.dumps(summary) + "\n"
+
+
+def _pcm16_to_float(raw: bytes) -> np.ndarray:
+    if len(raw) % 2 != 0:
+        raise ValueError("Audio payload must be 16-bit PCM")
+    return np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _ducked_speech_frames(session: SessionState, audio: np.ndarray) -> np.ndarray:
+    session.vad.margin_db += PLAYBACK_DUCK_DB
+    try:
+        return session.vad.speech_frames(audio)
+    finally:
+        session.vad.margin_db -= PLAYBACK_DUCK_DB
+
+
+async def _process_audio(
+    session: SessionState,
+    audio: np.ndarray,
+    sample_rate: int,
+    finalize: bool,
+    latency_budget_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Run one chunk through resampling, VAD and decoding; return the client payload."""
+    audio = session.resample(audio, sample_rate, finish=finalize)
+    session.audio_seconds += audio.size / TARGET_SAMPLE_RATE
+    during_playback = (
+        PLAYBACK_MODE != "off" and session.device_id is not None and playback.playing(session.device_id)
+    )
+    # Muted audio still goes through the VAD (with the duck margin), only to
+    # notice a visitor talking over the reply; nothing is transcribed unless
+    # that happens.
+    flags = _ducked_speech_frames(session, audio) if during_playback and VAD_ENABLED else None
+    talking_over = flags is not None and np.count_nonzero(flags) >= VAD_MIN_SPEECH_FRAMES
+    if during_playback and PLAYBACK_MODE == "mute" and not talking_over:
+        # Our own voice: keep it out of the buffer, but let it count as silence
+        # so an utterance that was in progress can still end.
+        playback_suppressed_seconds.inc(audio.size / TARGET_SAMPLE_RATE)
+        if session.has_speech:
+            session.trailing_silence += audio.size / TARGET_SAMPLE_RATE
+        contains_speech = False
+    elif flags is not None:
+        contains_speech = session.feed(audio, flags)
+    elif VAD_ENABLED:
+        contains_speech = session.feed(audio)
+    else:
+        session.append_audio(audio)
+        contains_speech = True
+
+    # Barge-in: the visitor talking again drops the reply still being prepared
+    # or played for this kiosk (frees the LLM and kills piper/ffmpeg).
+    barge_in = False
+    if contains_speech and VAD_ENABLED and session.device_id is not None:
+        barge_in = turns.cancel_device(session.device_id, "barge-in") > 0 or during_playback
+        if during_playback:
+            playback.stop(session.device_id)
+
+    is_final = bool(finalize) or (VAD_ENABLED and session.endpoint_reached)
+    profile = None
+    # A silent chunk that ends an utterance still gets one full-quality pass.
+    if contains_speech or (is_final and session.has_speech):
+        profile = _select_profile(is_final, latency_budget_ms, session.speech_window().size / TARGET_SAMPLE_RATE)
+        # Only the uncommitted tail is decoded; committed text conditions the decoder.
+        job = session.decode_job(profile)
+        segments = await _transcribe_audio(job)
+        session.apply_decode(segments, refine=_scheduler_for(profile) is _partial_scheduler)
+        _start_refinements(session)
+        session.decodes += 1
+        session.decode_seconds += job.decode_seconds
+        session.queue_seconds += job.queue_seconds
+    if is_final and session.refinement_tasks:
+        # The final transcript carries large-model text for every committed part.
+        await asyncio.gather(*session.refinement_tasks, return_exceptions=True)
+    text = session.transcript
     delta_text = text[len(session.last_text) :].lstrip() if text.startswith(session.last_text) else text
     session.last_text = text
 
-    if finalize:
+    if is_final:
+        session.utterances += 1
+        session.reset_utterance()
+    return {
+        "text": text,
+        "delta": delta_text,
+        "is_final": is_final,
+        "profile": profile,
+        "playback": during_playback,
+        "barge_in": barge_in,
+    }
+
+
+_FINALIZE = object()
+
+
+@router.websocket("/speech/ws")
+async def speech_socket(
+    websocket: WebSocket,
+    sample_rate: int = Query(TARGET_SAMPLE_RATE),
+    latency_budget_ms: Optional[float] = Query(None),
+    codec: str = Query("pcm"),
+    device_id: Optional[str] = Query(None),
+):
+    """Streaming ASR over one socket.
+
+    Binary frames carry 16-bit mono PCM at ``sample_rate``, or with
+    ``codec=ogg``/``codec=webm`` consecutive pieces of an Opus stream (a new
+    stream starts after each finalize); the text frame
+    ``{"type": "finalize"}`` closes the current utterance.  Every processed
+    batch of audio is answered with the same JSON payload as
+    ``/speech/stream``; ``latency_budget_ms`` and ``device_id`` play the role
+    of the ``X-Latency-Budget-Ms`` and ``X-Device-Id`` headers.  The session exists exactly as long as
+    the socket.
+    """
+    await websocket.accept()
+    if sample_rate <= 0:
+        await websocket.close(code=1008, reason="sample rate must be positive")
+        return
+    if latency_budget_ms is not None and latency_budget_ms <= 0:
+        await websocket.close(code=1008, reason="latency budget must be positive")
+        return
+    container = None if codec == "pcm" else container_for(f"audio/{codec}")
+    if codec != "pcm" and container is None:
+        await websocket.close(code=1008, reason="codec must be pcm, ogg or webm")
+        return
+
+    session_id = f"ws-{uuid.uuid4().hex}"
+    session = SessionState(socket_bound=True, device_id=device_id)
+    _prefetch_models()
+    _sessions.add(session_id, session)
+
+    inbox: asyncio.Queue = asyncio.Queue()
+
+    async def _receive() -> None:
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    inbox.put_nowait(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except ValueError:
+                        continue
+                    if isinstance(control, dict) and control.get("type") == "finalize":
+                        inbox.put_nowait(_FINALIZE)
+        finally:
+            inbox.put_nowait(None)
+
+    receiver = asyncio.create_task(_receive())
+    try:
+        closed = False
+        while not closed:
+            # Frames that arrived while the previous chunk was decoding are
+            # coalesced so a slow decode never builds a backlog.
+            items = [await inbox.get()]
+            while not inbox.empty():
+                items.append(inbox.get_nowait())
+
+            pending = bytearray()
+            for item in items:
+                if item is None:
+                    closed = True
+                    break
+                if item is _FINALIZE:
+                    await _send_socket_result(
+                        websocket,
+                        session,
+                        bytes(pending),
+                        sample_rate,
+                        finalize=True,
+                        budget_ms=latency_budget_ms,
+                        container=container,
+                    )
+                    pending.clear()
+                else:
+                    pending.extend(item)
+            if pending:
+                await _send_socket_result(
+                    websocket,
+                    session,
+                    bytes(pending),
+                    sample_rate,
+                    finalize=False,
+                    budget_ms=latency_budget_ms,
+                    container=container,
+                )
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
         await _remove_session(session_id)
-    else:
-        await _cleanup_sessions()
 
-    return {"text": text, "delta": delta_text, "is_final": bool(finalize)}
+
+async def _send_socket_result(
+    websocket: WebSocket,
+    session: SessionState,
+    raw: bytes,
+    sample_rate: int,
+    finalize: bool,
+    budget_ms: Optional[float] = None,
+    container: Optional[str] = None,
+) -> None:
+    try:
+        if container is not None:
+            audio = await session.decode_upload(raw, container, finish=finalize)
+            sample_rate = TARGET_SAMPLE_RATE
+        else:
+            audio = _pcm16_to_float(raw)
+    except FileNotFoundError:
+        await websocket.send_json({"error": "Compressed audio needs ffmpeg on the server"})
+        return
+    except ValueError as exc:
+        await websocket.send_json({"error": str(exc)})
+        return
+    await websocket.send_json(await _process_audio(session, audio, sample_rate, finalize, budget_ms))
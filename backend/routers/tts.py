@@ -1,107 +1,244 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
-import subprocess
-import uuid
-from contextlib import contextmanager
-from typing import Generator, Iterable
+from contextlib import closing
+from typing import AsyncIterator, Iterable, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query
 from fastapi.responses import StreamingResponse
 
+from ..asr.playback import OggDurationCounter, PcmDurationCounter, playback
+from ..cancellation import CancelToken, turns
+from ..voice.cache import AudioCache, cache_key
+from ..voice.encoding import (
+    DEFAULT_FORMAT,
+    create_async_encoder,
+    create_encoder,
+    media_type,
+    negotiate_format,
+    opus_backend,
+)
+from ..voice.pool import VoicePool, default_pool_size
+from ..voice.sentences import split_sentences
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 MODEL_PATH = "backend/voices/tr_TR-fahrettin-medium.onnx"
-CHUNK_SIZE = 4096
-_SENTENCE_ENDINGS = ".!?"
-# Piper stops mid-stream when hitting end-of-sentence punctuation, so map them to commas.
-_PIPER_TEXT_TRANSLATION = str.maketrans({char: "," for char in _SENTENCE_ENDINGS})
-
-
-@contextmanager
-def _piper_pipeline(text: str) -> Generator[subprocess.Popen, None, None]:
+OPUS_BITRATE = 64000
+# Silence between synthesized sentences/clauses.
+PIECE_GAP_SECONDS = 0.2
+# Preloaded Piper voices (one ONNX session each) shared by all requests; the
+# default splits the cores so every voice gets at least two threads.
+VOICE_POOL_SIZE = int(os.getenv("TTS_VOICE_POOL_SIZE", "0")) or default_pool_size()
+_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+voice_pool = VoicePool(MODEL_PATH, VOICE_POOL_SIZE, threads_per_voice=max(_cores // VOICE_POOL_SIZE, 1))
+# Replies repeat a lot ("Kapıyı açıyorum...", "Teslimat bulunamadı..."), so
+# finished audio is cached by (voice, normalized text, encoding).
+CACHE_MEMORY_BYTES = int(float(os.getenv("TTS_CACHE_MEMORY_MB", "64")) * 2**20)
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", "backend/.tts_cache")
+CACHE_DISK_BYTES = int(float(os.getenv("TTS_CACHE_DISK_MB", "512")) * 2**20)
+audio_cache = AudioCache(CACHE_MEMORY_BYTES, CACHE_DIR, CACHE_DISK_BYTES)
+_PIECE_GAP = bytes(2 * int(voice_pool.sample_rate * PIECE_GAP_SECONDS))
+
+
+def _encoding(fmt: str) -> str:
+    # Part of the cache key: changing the encoder or the gaps must not serve stale audio.
+    codec = f"opus-{OPUS_BITRATE}" if fmt == "ogg" else "s16"
+    return f"{fmt}-{codec}-gap{int(PIECE_GAP_SECONDS * 1000)}"
+
+
+def stream_tts_chunks(
+    text: str, cancel: Optional[CancelToken] = None, fmt: str = DEFAULT_FORMAT
+) -> Iterable[bytes]:
+    """``text`` as ``fmt`` audio, encoded chunk by chunk as Piper produces PCM.
+
+    The text is split into sentences (long ones into clauses) that the voice
+    pool synthesizes concurrently and in order, so audio starts flowing as
+    soon as the first piece is ready.  WAV and L16 are framed in place; Ogg
+    Opus is encoded in-process with PyAV when installed, else by an ffmpeg
+    child fed on stdin.
+    """
     if not text:
         raise ValueError("text must be non-empty")
+    if cancel is not None and cancel.cancelled:
+        return
+    try:
+        encoder = create_encoder(fmt, voice_pool.sample_rate, OPUS_BITRATE)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail="ffmpeg binary not found") from exc
+    try:
+        with closing(voice_pool.synthesize_pieces(split_sentences(text), cancel, gap=_PIECE_GAP)) as pcm_stream:
+            for pcm in pcm_stream:
+                data = encoder.encode(pcm)
+                if data:
+                    yield data
+        if cancel is not None and cancel.cancelled:
+            return
+        data = encoder.flush()
+        if data:
+            yield data
+    finally:
+        encoder.close()
 
-    fifo_path = f"/tmp/piper_{uuid.uuid4().hex}.wav"
-    os.mkfifo(fifo_path)
 
+async def astream_tts_chunks(
+    text: str, cancel: Optional[CancelToken] = None, fmt: str = DEFAULT_FORMAT
+) -> AsyncIterator[bytes]:
+    """:func:`stream_tts_chunks` on the event loop, for ``GET /api/tts``.
+
+    No threadpool thread waits on the listener: synthesis runs on the voice
+    pool's threads, encoding in-process or in an asyncio ffmpeg child, and a
+    slow reader holds synthesis back through bounded buffers.  When the
+    stream is closed early (client disconnect) or ``cancel`` fires, the
+    encoder is killed and the pool jobs stop right away.
+    """
+    if not text:
+        raise ValueError("text must be non-empty")
+    if cancel is not None and cancel.cancelled:
+        return
     try:
-        try:
-            piper_proc = subprocess.Popen(
-                ["piper", "--model", os.path.abspath(MODEL_PATH), "--output_file", fifo_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        except FileNotFoundError as exc:
-            raise HTTPException(status_code=500, detail="piper binary not found") from exc
-
-        assert piper_proc.stdin is not None  # for type checkers
-        try:
-            sanitized_text = text.translate(_PIPER_TEXT_TRANSLATION)
-            payload = sanitized_text.encode("utf-8")
-            piper_proc.stdin.write(payload)
-            piper_proc.stdin.flush()
-            piper_proc.stdin.close()
-        except BrokenPipeError as exc:
-            piper_proc.kill()
-            raise HTTPException(status_code=500, detail="Failed to feed TTS pipeline") from exc
-
-        try:
-            ffmpeg_proc = subprocess.Popen(
-                [
-                    "ffmpeg",
-                    "-hide_banner",
-                    "-loglevel",
-                    "error",
-                    "-i",
-                    fifo_path,
-                    "-c:a",
-                    "libopus",
-                    "-b:a",
-                    "64k",
-                    "-f",
-                    "ogg",
-                    "-",
-                ],
-                stdout=subprocess.PIPE,
-            )
-        except FileNotFoundError as exc:
-            piper_proc.kill()
-            raise HTTPException(status_code=500, detail="ffmpeg binary not found") from exc
-
-        assert ffmpeg_proc.stdout is not None
-        try:
-            yield ffmpeg_proc
-        finally:
-            ffmpeg_proc.stdout.close()
-            ffmpeg_proc.wait()
-            piper_proc.wait()
-    finally:
-        try:
-            os.remove(fifo_path)
-        except FileNotFoundError:
-            pass
-
-
-def stream_tts_chunks(text: str) -> Iterable[bytes]:
-    with _piper_pipeline(text) as ffmpeg_proc:
-        assert ffmpeg_proc.stdout is not None
-        while True:
-            data = ffmpeg_proc.stdout.read(CHUNK_SIZE)
-            if not data:
-                break
+        encoder = await create_async_encoder(fmt, voice_pool.sample_rate, OPUS_BITRATE)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail="ffmpeg binary not found") from exc
+    pcm_stream = voice_pool.asynthesize_pieces(split_sentences(text), cancel, gap=_PIECE_GAP)
+    try:
+        async for pcm in pcm_stream:
+            data = await encoder.encode(pcm)
+            if data:
+                yield data
+        if cancel is not None and cancel.cancelled:
+            return
+        data = await encoder.flush()
+        if data:
             yield data
+    finally:
+        encoder.close()
+        await pcm_stream.aclose()
+
+
+def cached_tts_chunks(
+    text: str, cancel: Optional[CancelToken] = None, fmt: str = DEFAULT_FORMAT
+) -> Iterable[bytes]:
+    """:func:`stream_tts_chunks` behind the audio cache.
+
+    A hit is served in one piece without touching the voice pool or encoder.
+    A miss streams as usual and is cached once the stream ends complete
+    (not cancelled, not abandoned by the reader, no synthesis error).
+    """
+    key = cache_key(voice_pool.name, text, _encoding(fmt))
+    cached = audio_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    audio = bytearray()
+    for chunk in stream_tts_chunks(text, cancel, fmt):
+        audio.extend(chunk)
+        yield chunk
+    if cancel is None or not cancel.cancelled:
+        audio_cache.put(key, bytes(audio))
+
+
+async def acached_tts_chunks(
+    text: str, cancel: Optional[CancelToken] = None, fmt: str = DEFAULT_FORMAT
+) -> AsyncIterator[bytes]:
+    """:func:`astream_tts_chunks` behind the audio cache (see :func:`cached_tts_chunks`)."""
+    key = cache_key(voice_pool.name, text, _encoding(fmt))
+    cached = audio_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    audio = bytearray()
+    async for chunk in astream_tts_chunks(text, cancel, fmt):
+        audio.extend(chunk)
+        yield chunk
+    if cancel is None or not cancel.cancelled:
+        # The disk tier writes a file; keep it off the event loop.
+        await asyncio.get_running_loop().run_in_executor(None, audio_cache.put, key, bytes(audio))
 
 
-def synthesize_tts_bytes(text: str) -> bytes:
+def synthesize_tts_bytes(text: str, cancel: Optional[CancelToken] = None) -> bytes:
+    """Whole reply as Ogg Opus; empty if ``cancel`` fires before it is done."""
     audio = bytearray()
-    for chunk in stream_tts_chunks(text):
+    for chunk in cached_tts_chunks(text, cancel):
         audio.extend(chunk)
+    if cancel is not None and cancel.cancelled:
+        return b""
     return bytes(audio)
 
 
+async def warm_up() -> None:
+    """Load the voice pool and run one short synthesis so the pipeline is checked."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, voice_pool.start)
+    # Bypasses the cache, which would hide a broken pipeline after the first run.
+    audio = await loop.run_in_executor(None, lambda: b"".join(stream_tts_chunks("Merhaba")))
+    if not audio:
+        raise RuntimeError("TTS warm-up produced no audio")
+    if opus_backend() == "ffmpeg":
+        logger.warning("PyAV is not installed; every Opus reply starts an ffmpeg process (pip install av)")
+    logger.info("TTS ready, Opus encoding via %s", opus_backend())
+
+
+async def _track_playback(chunks: AsyncIterator[bytes], device_id: str, fmt: str) -> AsyncIterator[bytes]:
+    # The kiosk starts playing with the first bytes; the full length is only
+    # known once the encoder finishes, so the window stays open until then.
+    if fmt == "ogg":
+        counter = OggDurationCounter(OPUS_BITRATE)
+    else:
+        counter = PcmDurationCounter(voice_pool.sample_rate, header_bytes=44 if fmt == "wav" else 0)
+    started = False
+    try:
+        async for chunk in chunks:
+            if not started:
+                playback.start(device_id)
+                started = True
+            counter.feed(chunk)
+            yield chunk
+    finally:
+        # Close the inner stream now rather than whenever it is collected.
+        await chunks.aclose()
+        if started:
+            playback.extend(device_id, counter.seconds)
+
+
+async def _release_turn(
+    chunks: AsyncIterator[bytes], session_id: Optional[str], token: CancelToken
+) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+        turns.close(session_id, token)
+
+
 @router.get("/tts")
-def tts_stream(text: str = Query(..., min_length=1)):
-    return StreamingResponse(stream_tts_chunks(text), media_type="audio/ogg")
+async def tts_stream(
+    text: str = Query(..., min_length=1),
+    device_id: Optional[str] = Query(None),
+    session_id: Optional[str] = Query(None),
+    accept: Optional[str] = Header(None),
+):
+    """Stream ``text`` as Ogg Opus, or as WAV / raw PCM when ``Accept`` asks for it.
+
+    ``audio/wav`` gets a streaming header (unknown length) and ``audio/L16``
+    big-endian samples at the voice's rate; both skip Opus encoding, for
+    kiosks on the LAN.  With ``session_id`` the synthesis is cancelled by
+    ``POST /api/chat/cancel``; with ``device_id`` by the visitor speaking on
+    a speech stream from that kiosk.
+    """
+    fmt = negotiate_format(accept)
+    if fmt is None:
+        raise HTTPException(status_code=406, detail="Supported types: audio/ogg, audio/wav, audio/L16.")
+    token = turns.open(session_id, device_id=device_id) if session_id or device_id else None
+    chunks = acached_tts_chunks(text, token, fmt)
+    if device_id:
+        chunks = _track_playback(chunks, device_id, fmt)
+    if token is not None:
+        chunks = _release_turn(chunks, session_id, token)
+    return StreamingResponse(
+        chunks, media_type=media_type(fmt, voice_pool.sample_rate), headers={"Vary": "Accept"}
+    )
@@ -0,0 +1 @@
+"""voice package for the in-process TTS pipeline used by the tts router."""
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from ..metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+cache_lookups = Counter("tts_cache_lookups_total", "TTS cache lookups, by the tier that answered.", ("result",))
+cache_bytes = Gauge("tts_cache_bytes", "Encoded audio held by the TTS cache.", ("tier",))
+cache_evictions = Counter("tts_cache_evictions_total", "Entries evicted from the TTS cache.", ("tier",))
+
+SUFFIX = ".audio"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Same spoken text, same key: NFC and collapsed whitespace (case is kept)."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(voice: str, text: str, encoding: str) -> str:
+    material = "\x00".join((voice, encoding, normalize_text(text)))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Encoded TTS audio by content key, in an LRU memory tier over a disk tier.
+
+    A memory hit is a dict lookup.  The disk tier (one file per key, written
+    atomically) survives restarts; a disk hit is promoted to memory.  Both
+    tiers evict least recently used entries once over their byte budget, and
+    a budget of 0 disables that tier.
+    """
+
+    def __init__(self, memory_bytes: int, directory: Optional[str] = None, disk_bytes: int = 0) -> None:
+        self.memory_limit = memory_bytes
+        self.directory = directory if directory and disk_bytes > 0 else None
+        self.disk_limit = disk_bytes if self.directory else 0
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            self._scan()
+
+    def _scan(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(SUFFIX):
+                # Half-written files from a crash.
+                if name.endswith(".tmp"):
+                    os.unlink(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name[: -len(SUFFIX)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self._evict_disk()
+        cache_bytes.labels(tier="disk").set(self._disk_size)
+        logger.info("TTS disk cache: %d entries, %.1f MB", len(self._disk), self._disk_size / 2**20)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                cache_lookups.labels(result="memory").inc()
+                return data
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as handle:
+                    data = handle.read()
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+                self._forget_disk(key)
+            if data is not None:
+                cache_lookups.labels(result="disk").inc()
+                self._remember(key, data)
+                return data
+        cache_lookups.labels(result="miss").inc()
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        self._remember(key, data)
+        if not self.directory or len(data) > self.disk_limit:
+            return
+        with self._lock:
+            if key in self._disk:
+                return
+        temp = os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp, "wb") as handle:
+                handle.write(data)
+            os.replace(temp, self._path(key))
+        except OSError:
+            logger.exception("could not write TTS cache entry %s", key)
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_size += len(data)
+            self._evict_disk()
+            cache_bytes.labels(tier="disk").set(self._disk_size)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_limit:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous)
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_limit:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+                cache_evictions.labels(tier="memory").inc()
+            cache_bytes.labels(tier="memory").set(self._memory_size)
+
+    def _evict_disk(self) -> None:
+        # Caller holds self._lock (or is the constructor).
+        while self._disk_size > self.disk_limit and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            cache_evictions.labels(tier="disk").inc()
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _forget_disk(self, key: str) -> None:
+        with self._lock:
+            size = self._disk.pop(key, None)
+            if size is not None:
+                self._disk_size -= size
+                cache_bytes.labels(tier="disk").set(self._disk_size)
@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import io
+import logging
+import struct
+import subprocess
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import av
+except ImportError:  # optional: Opus then goes through an ffmpeg subprocess
+    av = None
+
+logger = logging.getLogger(__name__)
+
+OPUS_RATE = 48000
+# Ogg pages are flushed at least this often (microseconds), so the first
+# sentence reaches the client without waiting for a full default 1 s page.
+OGG_PAGE_DURATION_US = 100000
+# The asyncio ffmpeg reader starts with small reads so the first page goes
+# out at once, and doubles them while the pipe keeps filling them.
+MIN_READ_SIZE = 4096
+MAX_READ_SIZE = 65536
+
+# Output formats by name: (media type, what a client may list in Accept).
+FORMATS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "ogg": ("audio/ogg", ("audio/ogg", "audio/opus")),
+    "wav": ("audio/wav", ("audio/wav", "audio/wave", "audio/x-wav")),
+    "pcm": ("audio/L16", ("audio/l16",)),
+}
+DEFAULT_FORMAT = "ogg"
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """Best output format for an ``Accept`` header; ``None`` when none is acceptable.
+
+    Wildcards and a missing header get Ogg Opus.  Among explicitly listed
+    types the highest q wins, ties going to the order in the header.
+    """
+    if not accept or not accept.strip():
+        return DEFAULT_FORMAT
+    ranked: List[Tuple[float, int, str]] = []
+    for position, item in enumerate(accept.split(",")):
+        media, *params = (part.strip() for part in item.split(";"))
+        media = media.lower()
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality <= 0:
+            continue
+        if media in ("*/*", "audio/*"):
+            ranked.append((quality, position, DEFAULT_FORMAT))
+            continue
+        for name, (_, accepted) in FORMATS.items():
+            if media in accepted:
+                ranked.append((quality, position, name))
+    if not ranked:
+        return None
+    ranked.sort(key=lambda entry: (-entry[0], entry[1]))
+    return ranked[0][2]
+
+
+def media_type(fmt: str, sample_rate: int) -> str:
+    if fmt == "pcm":
+        return f"audio/L16; rate={sample_rate}; channels=1"
+    return FORMATS[fmt][0]
+
+
+def wav_header(sample_rate: int) -> bytes:
+    """16-bit mono WAV header for a stream of unknown length (sizes set to the maximum)."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        0xFFFFFFFF,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        1,
+        sample_rate,
+        sample_rate * 2,
+        2,
+        16,
+        b"data",
+        0xFFFFFFFF,
+    )
+
+
+def _ffmpeg_opus_command(sample_rate: int, bitrate: int) -> List[str]:
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "s16le",
+        "-ar",
+        str(sample_rate),
+        "-ac",
+        "1",
+        "-i",
+        "pipe:0",
+        "-c:a",
+        "libopus",
+        "-b:a",
+        str(bitrate),
+        "-page_duration",
+        str(OGG_PAGE_DURATION_US),
+        "-f",
+        "ogg",
+        "-",
+    ]
+
+
+class PcmEncoder(abc.ABC):
+    """Turns Piper's 16-bit little-endian mono PCM into one output format, chunk by chunk."""
+
+    @abc.abstractmethod
+    def encode(self, pcm: bytes) -> bytes:
+        """Encoded bytes ready to send for one chunk of PCM (may be empty)."""
+
+    def flush(self) -> bytes:
+        """Whatever is still buffered once the input has ended."""
+        return b""
+
+    def close(self) -> None:
+        """Release resources; safe after :meth:`flush` and on abandoned streams."""
+
+
+class WavEncoder(PcmEncoder):
+    def __init__(self, sample_rate: int) -> None:
+        self._header: Optional[bytes] = wav_header(sample_rate)
+
+    def encode(self, pcm: bytes) -> bytes:
+        if self._header is None:
+            return pcm
+        data, self._header = self._header + pcm, None
+        return data
+
+    def flush(self) -> bytes:
+        # A reply with no audio is still a valid (empty) file.
+        return self.encode(b"")
+
+
+class L16Encoder(PcmEncoder):
+    """audio/L16 is big-endian (RFC 3551)."""
+
+    def encode(self, pcm: bytes) -> bytes:
+        return np.frombuffer(pcm, dtype="<i2").astype(">i2").tobytes()
+
+
+class _Sink(io.RawIOBase):
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class AvOpusEncoder(PcmEncoder):
+    """In-process Ogg Opus through PyAV (libavcodec's libopus), no subprocess."""
+
+    def __init__(self, sample_rate: int, bitrate: int) -> None:
+        self.sample_rate = sample_rate
+        self._sink = _Sink()
+        self._container = av.open(
+            self._sink, "w", format="ogg", options={"page_duration": str(OGG_PAGE_DURATION_US)}
+        )
+        self._stream = self._container.add_stream("libopus", rate=OPUS_RATE, layout="mono")
+        self._stream.bit_rate = bitrate
+        self._resampler = av.AudioResampler(format="s16", layout="mono", rate=OPUS_RATE)
+        self._closed = False
+
+    def _mux(self, frames) -> None:
+        for frame in frames:
+            for packet in self._stream.encode(frame):
+                self._container.mux(packet)
+
+    def encode(self, pcm: bytes) -> bytes:
+        samples = np.frombuffer(pcm, dtype="<i2").reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = self.sample_rate
+        self._mux(self._resampler.resample(frame))
+        return self._sink.drain()
+
+    def flush(self) -> bytes:
+        self._mux(self._resampler.resample(None))
+        for packet in self._stream.encode(None):
+            self._container.mux(packet)
+        self._container.close()
+        self._closed = True
+        return self._sink.drain()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            try:
+                self._container.close()
+            except Exception:
+                pass
+
+
+class FfmpegOpusEncoder(PcmEncoder):
+    """Ogg Opus through an ``ffmpeg`` child reading PCM on stdin (used without PyAV).
+
+    A reader thread drains stdout so writes never deadlock on a full pipe;
+    :meth:`encode` returns whatever the encoder has produced so far.
+    """
+
+    def __init__(self, sample_rate: int, bitrate: int) -> None:
+        self._proc = subprocess.Popen(
+            _ffmpeg_opus_command(sample_rate, bitrate),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._output = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="tts-ffmpeg-read", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        stdout = self._proc.stdout
+        while True:
+            data = stdout.read1(65536)
+            if not data:
+                return
+            with self._lock:
+                self._output.extend(data)
+
+    def _drain(self) -> bytes:
+        with self._lock:
+            data = bytes(self._output)
+            self._output.clear()
+        return data
+
+    def encode(self, pcm: bytes) -> bytes:
+        self._proc.stdin.write(pcm)
+        self._proc.stdin.flush()
+        return self._drain()
+
+    def flush(self) -> bytes:
+        self._proc.stdin.close()
+        self._reader.join()
+        self._proc.wait()
+        if self._proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {self._proc.returncode}")
+        return self._drain()
+
+    def close(self) -> None:
+        if self._proc.poll() is None:
+            try:
+                self._proc.kill()
+            except ProcessLookupError:
+                pass
+        self._proc.wait()
+        self._reader.join()
+        for pipe in (self._proc.stdin, self._proc.stdout):
+            try:
+                pipe.close()
+            except (BrokenPipeError, ValueError):
+                pass
+
+
+class AsyncFfmpegOpusEncoder:
+    """Ogg Opus from an asyncio ``ffmpeg`` child, for the async TTS stream.
+
+    Writes wait on the stdin drain, and a reader task collects stdout with
+    adaptive read sizes.  :meth:`close` kills the child without awaiting, so
+    it also works from a task that is being cancelled.
+    """
+
+    def __init__(self, proc: asyncio.subprocess.Process) -> None:
+        self._proc = proc
+        self._output = bytearray()
+        self._reader = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def start(cls, sample_rate: int, bitrate: int) -> "AsyncFfmpegOpusEncoder":
+        proc = await asyncio.create_subprocess_exec(
+            *_ffmpeg_opus_command(sample_rate, bitrate),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        return cls(proc)
+
+    async def _read(self) -> None:
+        size = MIN_READ_SIZE
+        while True:
+            data = await self._proc.stdout.read(size)
+            if not data:
+                return
+            self._output.extend(data)
+            size = min(size * 2, MAX_READ_SIZE) if len(data) == size else max(size // 2, MIN_READ_SIZE)
+
+    def _drain(self) -> bytes:
+        data = bytes(self._output)
+        self._output.clear()
+        return data
+
+    async def encode(self, pcm: bytes) -> bytes:
+        self._proc.stdin.write(pcm)
+        await self._proc.stdin.drain()
+        return self._drain()
+
+    async def flush(self) -> bytes:
+        self._proc.stdin.close()
+        await self._reader
+        returncode = await self._proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with {returncode}")
+        return self._drain()
+
+    def close(self) -> None:
+        if self._proc.returncode is None:
+            try:
+                self._proc.kill()
+            except ProcessLookupError:
+                pass
+        self._reader.cancel()
+
+
+class _InlineEncoder:
+    """Async face of an in-process encoder; encoding a chunk takes well under a millisecond."""
+
+    def __init__(self, encoder: PcmEncoder) -> None:
+        self._encoder = encoder
+
+    async def encode(self, pcm: bytes) -> bytes:
+        return self._encoder.encode(pcm)
+
+    async def flush(self) -> bytes:
+        return self._encoder.flush()
+
+    def close(self) -> None:
+        self._encoder.close()
+
+
+def create_encoder(fmt: str, sample_rate: int, bitrate: int) -> PcmEncoder:
+    if fmt == "wav":
+        return WavEncoder(sample_rate)
+    if fmt == "pcm":
+        return L16Encoder()
+    if av is not None:
+        return AvOpusEncoder(sample_rate, bitrate)
+    return FfmpegOpusEncoder(sample_rate, bitrate)
+
+
+def opus_backend() -> str:
+    return "pyav" if av is not None else "ffmpeg"
+
+
+async def create_async_encoder(fmt: str, sample_rate: int, bitrate: int):
+    """Encoder with async ``encode``/``flush`` and a synchronous ``close``."""
+    if fmt == "ogg" and av is None:
+        return await AsyncFfmpegOpusEncoder.start(sample_rate, bitrate)
+    return _InlineEncoder(create_encoder(fmt, sample_rate, bitrate))
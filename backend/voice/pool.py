@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from ..metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+_CANCEL_POLL_SECONDS = 0.05
+_CANCELLED = object()
+
+voice_pool_size = Gauge("tts_voice_pool_size", "Piper voices loaded in the pool.", ("voice",))
+voice_pool_idle = Gauge("tts_voice_pool_idle", "Pool voices currently free.", ("voice",))
+voice_warmup_seconds = Histogram(
+    "tts_voice_warmup_seconds",
+    "Time to load one pooled Piper voice and run its warm-up synthesis.",
+    ("voice",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0),
+)
+voice_queue_wait_seconds = Histogram(
+    "tts_voice_queue_wait_seconds",
+    "Time a synthesis waits for a free pooled voice.",
+    ("voice",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+voice_synthesis_seconds = Histogram(
+    "tts_voice_synthesis_seconds",
+    "Time a pooled voice spends synthesizing one text.",
+    ("voice",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0),
+)
+
+
+def default_pool_size() -> int:
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    # Each voice gets at least two intra-op threads; more voices than that only contend.
+    return max(1, min(4, cores // 2))
+
+
+def _load_voice(model_path: str, threads: int):
+    from piper.voice import PiperVoice
+
+    voice = PiperVoice.load(model_path)
+    session = getattr(voice, "session", None)
+    if session is not None and threads > 0:
+        # PiperVoice.load gives every session all cores; pooled voices split them.
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        voice.session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=session.get_providers())
+    return voice
+
+
+def pcm_chunks(voice: Any, text: str) -> Iterator[bytes]:
+    """16-bit mono PCM from a Piper voice, one chunk per sentence.
+
+    piper-tts 1.3 made ``synthesize`` a generator of ``AudioChunk``s and
+    dropped ``synthesize_stream_raw``; both APIs are supported.
+    """
+    stream_raw = getattr(voice, "synthesize_stream_raw", None)
+    if stream_raw is not None:
+        yield from stream_raw(text)
+        return
+    for chunk in voice.synthesize(text):
+        yield chunk.audio_int16_bytes
+
+
+class VoicePool:
+    """Preloaded Piper voices, one ONNX session each, shared by all TTS requests.
+
+    Loading a voice reads the ONNX model and builds an inference session,
+    which costs far more than synthesizing a sentence, so voices are loaded
+    once and handed out with :meth:`acquire`.  The pool fills lazily on first
+    use unless :meth:`start` is called.
+    """
+
+    def __init__(self, model_path: str, size: int, threads_per_voice: int = 0) -> None:
+        self.model_path = os.path.abspath(model_path)
+        self.name = os.path.splitext(os.path.basename(model_path))[0]
+        self.size = max(size, 1)
+        self.threads_per_voice = threads_per_voice
+        with open(self.model_path + ".json", encoding="utf-8") as handle:
+            self.sample_rate = int(json.load(handle)["audio"]["sample_rate"])
+        self._idle: "queue.Queue[Any]" = queue.Queue()
+        self._voices: List[Any] = []
+        self._lock = threading.Lock()
+        self._started = False
+        voice_pool_size.labels(voice=self.name).set(0)
+        voice_pool_idle.labels(voice=self.name).set(0)
+
+    def start(self) -> None:
+        """Load and warm up every voice (blocking)."""
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                started = time.perf_counter()
+                voice = _load_voice(self.model_path, self.threads_per_voice)
+                for _ in pcm_chunks(voice, "Merhaba"):
+                    pass
+                voice_warmup_seconds.labels(voice=self.name).observe(time.perf_counter() - started)
+                self._voices.append(voice)
+                self._idle.put(voice)
+            self._started = True
+            voice_pool_size.labels(voice=self.name).set(len(self._voices))
+            voice_pool_idle.labels(voice=self.name).set(self._idle.qsize())
+        logger.info("loaded %d %s voice(s), %d threads each", self.size, self.name, self.threads_per_voice)
+
+    @contextlib.contextmanager
+    def acquire(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        if not self._started:
+            self.start()
+        started = time.perf_counter()
+        try:
+            voice = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no free {self.name} voice within {timeout}s") from None
+        voice_queue_wait_seconds.labels(voice=self.name).observe(time.perf_counter() - started)
+        voice_pool_idle.labels(voice=self.name).set(self._idle.qsize())
+        try:
+            yield voice
+        finally:
+            self._idle.put(voice)
+            voice_pool_idle.labels(voice=self.name).set(self._idle.qsize())
+
+    def synthesize(self, text: str, cancel: Any = None) -> Iterator[bytes]:
+        """PCM for ``text`` from a pooled voice; stops between sentences once ``cancel`` fires."""
+        with self.acquire() as voice:
+            started = time.perf_counter()
+            try:
+                for pcm in pcm_chunks(voice, text):
+                    if cancel is not None and cancel.cancelled:
+                        return
+                    yield pcm
+            finally:
+                voice_synthesis_seconds.labels(voice=self.name).observe(time.perf_counter() - started)
+
+    def synthesize_pieces(
+        self, texts: Iterable[str], cancel: Any = None, lookahead: int = 0, gap: bytes = b""
+    ) -> Iterator[bytes]:
+        """PCM for each text in order, with ``gap`` between them.
+
+        Up to ``lookahead`` pieces (default: the pool size) synthesize
+        concurrently on separate voices while the earliest one streams, so
+        the first audio depends only on the first piece.  Closing the
+        iterator stops the pending pieces at their next chunk.
+        """
+        lookahead = lookahead or self.size
+        stop = threading.Event()
+        pending: Deque["queue.Queue[Any]"] = collections.deque()
+        remaining = iter(texts)
+
+        def run(text: str, out: "queue.Queue[Any]") -> None:
+            try:
+                for pcm in self.synthesize(text, cancel):
+                    if stop.is_set():
+                        break
+                    out.put(pcm)
+            except BaseException as exc:
+                out.put(exc)
+            finally:
+                out.put(None)
+
+        def start_next() -> bool:
+            text = next(remaining, None)
+            if text is None:
+                return False
+            out: "queue.Queue[Any]" = queue.Queue()
+            threading.Thread(target=run, args=(text, out), name="tts-piece", daemon=True).start()
+            pending.append(out)
+            return True
+
+        try:
+            while len(pending) < lookahead and start_next():
+                pass
+            first = True
+            while pending:
+                out = pending.popleft()
+                start_next()
+                if not first and gap:
+                    yield gap
+                first = False
+                while True:
+                    try:
+                        item = out.get(timeout=_CANCEL_POLL_SECONDS)
+                    except queue.Empty:
+                        # Return on cancel without waiting for the piece's next chunk.
+                        if cancel is not None and cancel.cancelled:
+                            return
+                        continue
+                    if item is None:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    yield item
+        finally:
+            stop.set()
+
+    async def asynthesize_pieces(
+        self, texts: Iterable[str], cancel: Any = None, lookahead: int = 0, gap: bytes = b"", buffered: int = 8
+    ) -> AsyncIterator[bytes]:
+        """Asyncio counterpart of :meth:`synthesize_pieces`.
+
+        Pieces still synthesize on their own threads (ONNX inference holds a
+        voice, not the event loop) and hand chunks to the loop.  Each piece
+        keeps at most ``buffered`` chunks ahead of the reader, so a slow
+        client stalls synthesis instead of piling up audio.  Cancellation
+        wakes the reader at once; closing the iterator (client gone) stops
+        every piece at its next chunk and returns its voice to the pool.
+        """
+        loop = asyncio.get_running_loop()
+        lookahead = lookahead or self.size
+        stop = threading.Event()
+        pending: Deque[Tuple["asyncio.Queue[Any]", threading.Semaphore]] = collections.deque()
+        started: List["asyncio.Queue[Any]"] = []
+        remaining = iter(texts)
+
+        def run(text: str, out: "asyncio.Queue[Any]", slots: threading.Semaphore) -> None:
+            def deliver(item: Any) -> None:
+                try:
+                    loop.call_soon_threadsafe(out.put_nowait, item)
+                except RuntimeError:
+                    stop.set()  # event loop already closed
+
+            try:
+                with contextlib.closing(self.synthesize(text, cancel)) as pcm_stream:
+                    for pcm in pcm_stream:
+                        while not slots.acquire(timeout=_CANCEL_POLL_SECONDS):
+                            if stop.is_set():
+                                return
+                        if stop.is_set():
+                            return
+                        deliver(pcm)
+            except BaseException as exc:
+                deliver(exc)
+            finally:
+                deliver(None)
+
+        def start_next() -> bool:
+            text = next(remaining, None)
+            if text is None:
+                return False
+            out: "asyncio.Queue[Any]" = asyncio.Queue()
+            slots = threading.Semaphore(buffered)
+            threading.Thread(target=run, args=(text, out, slots), name="tts-piece", daemon=True).start()
+            pending.append((out, slots))
+            started.append(out)
+            return True
+
+        def wake() -> None:
+            for out in started:
+                out.put_nowait(_CANCELLED)
+
+        unregister = cancel.on_cancel(lambda: loop.call_soon_threadsafe(wake)) if cancel is not None else None
+        try:
+            while len(pending) < lookahead and start_next():
+                pass
+            first = True
+            while pending:
+                out, slots = pending.popleft()
+                start_next()
+                if not first and gap:
+                    yield gap
+                first = False
+                while True:
+                    item = await out.get()
+                    if item is None:
+                        break
+                    if item is _CANCELLED:
+                        return
+                    if isinstance(item, BaseException):
+                        raise item
+                    slots.release()
+                    yield item
+        finally:
+            stop.set()
+            if unregister is not None:
+                unregister()
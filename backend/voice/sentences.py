@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import re
+from typing import List
+
+# Sentence ends need trailing whitespace so "3.5" or "www.site.com" stay whole.
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"'”’)]*\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+# Sentences longer than this are split at clause punctuation as well, so the
+# first piece (and so the first audio) comes back quickly.
+MAX_PIECE_CHARS = 120
+# Shorter fragments ("Evet.", "Tamam,") are joined to the next piece; on
+# their own they cost a synthesis call and sound clipped.
+MIN_PIECE_CHARS = 12
+
+
+def split_sentences(text: str, max_chars: int = MAX_PIECE_CHARS, min_chars: int = MIN_PIECE_CHARS) -> List[str]:
+    """Split ``text`` into sentences, and long sentences into clauses, for piecewise synthesis."""
+    pieces: List[str] = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        clause = ""
+        for part in _CLAUSE_END.split(sentence):
+            clause = f"{clause} {part}" if clause else part
+            if len(clause) >= min_chars:
+                pieces.append(clause)
+                clause = ""
+        if clause:
+            pieces.append(clause)
+
+    merged: List[str] = []
+    carry = ""
+    for piece in pieces:
+        piece = f"{carry} {piece}" if carry else piece
+        carry = ""
+        if len(piece) < min_chars:
+            carry = piece
+        else:
+            merged.append(piece)
+    if carry:
+        if merged:
+            merged[-1] = f"{merged[-1]} {carry}"
+        else:
+            merged.append(carry)
+    return merged
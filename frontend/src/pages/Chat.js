@@ -31,6 +31,49 @@ import remarkGfm from "remark-gfm";
 // The backend exposes routes under the /api prefix
 const apiBase = "http://localhost:5000/api";
 
+// Opus uploads are roughly a tenth of the size of 16-bit PCM; the backend
+// decodes them with ffmpeg. Browsers without these fall back to PCM.
+const compressedUploadTypes = ["audio/webm;codecs=opus", "audio/ogg;codecs=opus"];
+const compressedUploadBitrate = 32000;
+
+// Identifies this kiosk to the backend so speech recognition can ignore the
+// microphone while our own TTS reply is playing.
+const deviceId = crypto.randomUUID();
+
+const signalPlayback = (state, durationSeconds) => {
+    fetch(`${apiBase}/speech/playback`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+            deviceId,
+            state,
+            durationSeconds: Number.isFinite(durationSeconds)
+                ? durationSeconds
+                : null,
+        }),
+    }).catch((err) => console.warn("playback signal failed", err));
+};
+
+// Tells the backend to drop the reply it is still preparing for this kiosk
+// (LLM request and TTS synthesis).
+const cancelReply = () => {
+    fetch(`${apiBase}/chat/cancel`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ sessionId: deviceId, deviceId }),
+    }).catch((err) => console.warn("cancel reply failed", err));
+};
+
+const pickCompressedUploadType = () => {
+    if (typeof MediaRecorder === "undefined" || !MediaRecorder.isTypeSupported) {
+        return null;
+    }
+    return (
+        compressedUploadTypes.find((type) => MediaRecorder.isTypeSupported(type)) ||
+        null
+    );
+};
+
 /**
  * Chat message shape
  * id: string
@@ -54,6 +97,9 @@ export function Chat() {
     const audioContextRef = useRef(null);
     const processorRef = useRef(null);
     const mediaStreamRef = useRef(null);
+    const recorderRef = useRef(null);
+    const replyAudioRef = useRef(null);
+    const uploadTypeRef = useRef(null);
     const bufferedChunksRef = useRef([]);
     const flushTimerRef = useRef(null);
     const voiceSessionIdRef = useRef(null);
@@ -168,11 +214,29 @@ export function Chat() {
         return int16;
     };
 
+    const stopReplyAudio = useCallback(() => {
+        if (replyAudioRef.current) {
+            replyAudioRef.current.pause();
+            replyAudioRef.current = null;
+        }
+    }, []);
+
     const cleanupRecording = useCallback(async () => {
         if (flushTimerRef.current) {
             window.clearInterval(flushTimerRef.current);
             flushTimerRef.current = null;
         }
+        if (recorderRef.current) {
+            recorderRef.current.ondataavailable = null;
+            if (recorderRef.current.state !== "inactive") {
+                try {
+                    recorderRef.current.stop();
+                } catch (err) {
+                    console.warn("recorder stop failed", err);
+                }
+            }
+            recorderRef.current = null;
+        }
         if (processorRef.current) {
             try {
                 processorRef.current.disconnect();
@@ -203,19 +267,24 @@ export function Chat() {
             }
 
             const sessionId = voiceSessionIdRef.current;
-            const sampleRate = Math.round(
-                audioContextRef.current?.sampleRate || 48000
-            );
+            const headers = {
+                "X-Session-Id": sessionId,
+                "X-Device-Id": deviceId,
+                "X-Finalize": finalize ? "true" : "false",
+            };
+            if (uploadTypeRef.current) {
+                headers["Content-Type"] = uploadTypeRef.current;
+            } else {
+                headers["Content-Type"] = "application/octet-stream";
+                headers["X-Sample-Rate"] = String(
+                    Math.round(audioContextRef.current?.sampleRate || 48000)
+                );
+            }
 
             try {
                 const resp = await fetch(`${apiBase}/speech/stream`, {
                     method: "POST",
-                    headers: {
-                        "Content-Type": "application/octet-stream",
-                        "X-Session-Id": sessionId,
-                        "X-Sample-Rate": String(sampleRate),
-                        "X-Finalize": finalize ? "true" : "false",
-                    },
+                    headers,
                     body: arrayBuffer,
                 });
 
@@ -226,17 +295,22 @@ export function Chat() {
                 const data = await resp.json();
                 const text = data?.text ?? "";
                 setLiveTranscript(text);
+                if (data?.barge_in) {
+                    // The visitor talked over the reply; the server dropped it.
+                    stopReplyAudio();
+                }
 
                 if (isRecordingRef.current || finalize) {
-                    setInput(() => {
-                        const base = voiceBaseInputRef.current || "";
-                        const combined = text
-                            ? base
-                                ? `${base} ${text}`
-                                : text
-                            : base;
-                        return combined.trimStart();
-                    });
+                    const base = voiceBaseInputRef.current || "";
+                    const combined = (
+                        text ? (base ? `${base} ${text}` : text) : base
+                    ).trimStart();
+                    setInput(() => combined);
+                    if (data?.is_final && !finalize) {
+                        // The server closed the utterance after a pause; the
+                        // next partials belong to a fresh utterance.
+                        voiceBaseInputRef.current = combined;
+                    }
                 }
 
                 if (finalize) {
@@ -256,7 +330,7 @@ export function Chat() {
                 isSendingRef.current = false;
             }
         },
-        [cleanupRecording]
+        [cleanupRecording, stopReplyAudio]
     );
 
     const waitFor = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
@@ -281,7 +355,12 @@ export function Chat() {
             }
 
             let payload;
-            if (chunks.length) {
+            if (chunks.length && uploadTypeRef.current) {
+                // Consecutive MediaRecorder blobs continue one container stream.
+                payload = await new Blob(chunks, {
+                    type: uploadTypeRef.current,
+                }).arrayBuffer();
+            } else if (chunks.length) {
                 const totalLength = chunks.reduce(
                     (acc, chunk) => acc + chunk.length,
                     0
@@ -312,11 +391,48 @@ export function Chat() {
         setRecorderError("");
         setLastError("");
         voiceBaseInputRef.current = input;
+        if (replyAudioRef.current) {
+            // Speaking interrupts the reply that is still playing.
+            stopReplyAudio();
+            cancelReply();
+        }
 
         try {
             const mediaStream = await navigator.mediaDevices.getUserMedia({
                 audio: true,
             });
+            bufferedChunksRef.current = [];
+            voiceSessionIdRef.current = crypto.randomUUID();
+
+            const uploadType = pickCompressedUploadType();
+            uploadTypeRef.current = uploadType;
+            if (uploadType) {
+                const recorder = new MediaRecorder(mediaStream, {
+                    mimeType: uploadType,
+                    audioBitsPerSecond: compressedUploadBitrate,
+                });
+                recorder.ondataavailable = (event) => {
+                    if (event.data && event.data.size) {
+                        bufferedChunksRef.current.push(event.data);
+                    }
+                };
+                mediaStreamRef.current = mediaStream;
+                recorderRef.current = recorder;
+                recorder.start(250);
+
+                flushTimerRef.current = window.setInterval(() => {
+                    flushAudioBuffer(false).catch((err) =>
+                        console.error("flush audio", err)
+                    );
+                }, 750);
+
+                setIsRecording(true);
+                isRecordingRef.current = true;
+                setIsTranscribing(true);
+                setLiveTranscript("");
+                return;
+            }
+
             const AudioCtx = window.AudioContext || window.webkitAudioContext;
             if (!AudioCtx) {
                 throw new Error(
@@ -328,7 +444,6 @@ export function Chat() {
             const source = audioContext.createMediaStreamSource(mediaStream);
             const processor = audioContext.createScriptProcessor(4096, 1, 1);
 
-            bufferedChunksRef.current = [];
             processor.onaudioprocess = (event) => {
                 const inputBuffer = event.inputBuffer.getChannelData(0);
                 const pcm = floatToInt16(inputBuffer);
@@ -341,7 +456,6 @@ export function Chat() {
             mediaStreamRef.current = mediaStream;
             audioContextRef.current = audioContext;
             processorRef.current = processor;
-            voiceSessionIdRef.current = crypto.randomUUID();
 
             flushTimerRef.current = window.setInterval(() => {
                 flushAudioBuffer(false).catch((err) =>
@@ -366,7 +480,7 @@ export function Chat() {
             setIsRecording(false);
             setIsTranscribing(false);
         }
-    }, [cleanupRecording, flushAudioBuffer, input, isStreaming]);
+    }, [cleanupRecording, flushAudioBuffer, input, isStreaming, stopReplyAudio]);
 
     const stopRecording = useCallback(async () => {
         if (!isRecordingRef.current) {
@@ -385,6 +499,15 @@ export function Chat() {
             processorRef.current.onaudioprocess = null;
         }
 
+        const recorder = recorderRef.current;
+        if (recorder && recorder.state !== "inactive") {
+            // Stopping emits the last blob, which closes the container stream.
+            await new Promise((resolve) => {
+                recorder.onstop = resolve;
+                recorder.stop();
+            });
+        }
+
         try {
             await flushAudioBuffer(true);
         } catch (err) {
@@ -428,6 +551,7 @@ export function Chat() {
     };
 
     const stopStreaming = () => {
+        cancelReply();
         controllerRef.current?.abort();
         controllerRef.current = null;
         setIsStreaming(false);
@@ -446,6 +570,8 @@ export function Chat() {
             },
             body: JSON.stringify({
                 message: userText,
+                deviceId,
+                sessionId: deviceId,
                 history: messages
                     .filter((m) => m.role === "user" || m.role === "assistant")
                     .map((m) => ({ role: m.role, content: m.content })),
@@ -464,6 +590,16 @@ export function Chat() {
                 const audio = new Audio(
                     `data:${data.audioMimeType};base64,${data.audio}`
                 );
+                audio.onplay = () => signalPlayback("start", audio.duration);
+                audio.onended = () => {
+                    signalPlayback("stop");
+                    if (replyAudioRef.current === audio) {
+                        replyAudioRef.current = null;
+                    }
+                };
+                audio.onpause = () => signalPlayback("stop");
+                stopReplyAudio();
+                replyAudioRef.current = audio;
                 audio
                     .play()
                     .catch((err) => console.error("Audio play failed", err));
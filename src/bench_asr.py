@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Accuracy/speed comparison of the ASR backends (reference vs int8 CPU).
+
+Reports word error rate against a reference transcript and the real-time
+factor (decode seconds per audio second) for each backend and decode profile
+(all of them by default; --profiles final for just the full-quality one).
+
+Run from the repository root:
+    python src/bench_asr.py --audio clip.wav --reference "beklenen metin"
+    python src/bench_asr.py --voice src/voices/tr_TR-dfki-medium.onnx
+
+Without --audio the clip is synthesized from the built-in Turkish sentences
+with the Piper voice, so the reference transcript is exact.  Only the voice's
+.json config is checked in; download the matching .onnx (rhasspy/piper-voices
+on Hugging Face) next to it first.
+
+--batch-sizes also decodes batches of windows that each carry a different
+prompt, as concurrent speech sessions do, and reports windows per second:
+    python src/bench_asr.py --backends reference --batch-sizes 1,4,8
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.asr.backends import get_backend  # noqa: E402
+from backend.asr.decoding import SAMPLE_RATE, DecodeJob  # noqa: E402
+from backend.asr.profiles import PROFILES  # noqa: E402
+from backend.asr.resample import resample  # noqa: E402
+
+WINDOW_SAMPLES = SAMPLE_RATE * 30
+
+DEFAULT_SENTENCES = (
+    "Merhaba, size nasıl yardımcı olabilirim?",
+    "Yarın sabah saat dokuzda toplantı odasında buluşalım.",
+    "İstanbul'dan Ankara'ya giden tren on dakika gecikmeli kalkacak.",
+    "Lütfen siparişinizi onaylamak için evet deyin.",
+)
+
+
+def synthesizeClip(sentences, voicePath: str) -> np.ndarray:
+    from piper.voice import PiperVoice
+
+    voice = PiperVoice.load(str(Path(voicePath).resolve()))
+    mem = io.BytesIO()
+    with wave.open(mem, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(int(voice.config.sample_rate))
+        # piper-tts 1.3 renamed synthesize(text, wav) to synthesize_wav
+        synth = getattr(voice, "synthesize_wav", None) or voice.synthesize
+        synth(" ".join(sentences), w)
+    mem.seek(0)
+    with wave.open(mem, "rb") as r:
+        sr = r.getframerate()
+        pcm = np.frombuffer(r.readframes(r.getnframes()), dtype=np.int16)
+    return resample(pcm.astype(np.float32) / 32768.0, sr)
+
+
+def normalizeWords(text: str):
+    # Turkish casing: dotted/dotless I must not collapse to ASCII "i"
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    text = re.sub(r"[^\w\s']", " ", text).replace("'", "")
+    return text.split()
+
+
+def wordErrorRate(reference: str, hypothesis: str) -> float:
+    ref, hyp = normalizeWords(reference), normalizeWords(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    prev = list(range(len(hyp) + 1))
+    for i, refWord in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, hypWord in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (refWord != hypWord))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def transcribe(backend, model, audio: np.ndarray, profile: str) -> str:
+    parts = []
+    for start in range(0, audio.size, WINDOW_SAMPLES):
+        segments = backend.decode(model, [DecodeJob(audio[start : start + WINDOW_SAMPLES], profile=profile)])[0]
+        parts.extend(seg.text for seg in segments)
+    return " ".join(parts)
+
+
+def batchThroughput(backend, model, audio: np.ndarray, size: int, repeats: int) -> float:
+    # every session prompts with its own committed text, so no two rows share one
+    window = audio[:WINDOW_SAMPLES]
+    jobs = [
+        DecodeJob(window, prompt=" ".join(DEFAULT_SENTENCES[i % len(DEFAULT_SENTENCES) :][:2]) + f" {i}")
+        for i in range(size)
+    ]
+    backend.decode(model, jobs)  # warm-up
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.decode(model, jobs)
+        best = min(best, time.perf_counter() - start)
+    return size / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.getenv("WHISPER_MODEL", "large-v2"))
+    parser.add_argument("--backends", default="reference,int8", help="comma-separated backend names")
+    parser.add_argument("--audio", help="clip to transcribe (any format ffmpeg reads)")
+    parser.add_argument("--reference", help="reference transcript for --audio")
+    parser.add_argument("--voice", default="src/voices/tr_TR-dfki-medium.onnx", help="Piper voice used to synthesize the clip")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma-separated decode profiles")
+    parser.add_argument("--repeats", default=3, type=int)
+    parser.add_argument("--batch-sizes", default="", help="comma-separated batch sizes for the distinct-prompt throughput check")
+    args = parser.parse_args()
+
+    if args.audio:
+        import whisper
+
+        if not args.reference:
+            parser.error("--audio needs --reference")
+        audio, reference = whisper.load_audio(args.audio), args.reference
+    else:
+        if not Path(args.voice).is_file():
+            parser.error(
+                f"Piper voice {args.voice} not found (only its .json is in the repo); download the .onnx "
+                "from rhasspy/piper-voices, pass another --voice, or give --audio and --reference"
+            )
+        audio, reference = synthesizeClip(DEFAULT_SENTENCES, args.voice), " ".join(DEFAULT_SENTENCES)
+    seconds = audio.size / SAMPLE_RATE
+    print(f"clip: {seconds:.1f} s, model {args.model}")
+
+    for name in args.backends.split(","):
+        backend = get_backend(name.strip())
+        device = backend.resolve_device("cpu")
+        start = time.perf_counter()
+        model = backend.load(args.model, device)
+        loadTime = time.perf_counter() - start
+
+        print(f"  {backend.name:<10} load {loadTime:6.1f} s")
+        for profile in filter(None, (part.strip() for part in args.profiles.split(","))):
+            hypothesis = transcribe(backend, model, audio, profile)  # warm-up, also the scored run
+            best = float("inf")
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                transcribe(backend, model, audio, profile)
+                best = min(best, time.perf_counter() - start)
+
+            print(f"  {profile:<10} RTF {best / seconds:6.3f} | WER {wordErrorRate(reference, hypothesis):6.1%}")
+            print(f"  {'':<10} {hypothesis}")
+        for size in filter(None, args.batch_sizes.split(",")):
+            rate = batchThroughput(backend, model, audio, int(size), args.repeats)
+            print(f"  {'':<10} batch {int(size):>3}, distinct prompts: {rate:6.2f} windows/s")
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: np.interp resampling vs the cached polyphase resampler.
+
+Run from the repository root:  python src/bench_resample.py
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.asr.resample import StreamingResampler  # noqa: E402
+
+
+def interpResample(x: np.ndarray, origSr: int) -> np.ndarray:
+    # the previous per-chunk implementation, kept here as the baseline
+    newLen = int(round(x.shape[0] * 16000 / float(origSr)))
+    return np.interp(
+        np.linspace(0.0, 1.0, num=newLen, endpoint=False),
+        np.linspace(0.0, 1.0, num=x.shape[0], endpoint=False),
+        x.astype(np.float32),
+    ).astype(np.float32)
+
+
+def aliasLevelDb(resampleFn, origSr: int, toneHz: float) -> float:
+    # a tone above the 8 kHz output Nyquist should vanish instead of folding back
+    t = np.arange(origSr * 2) / float(origSr)
+    tone = (0.5 * np.sin(2 * np.pi * toneHz * t)).astype(np.float32)
+    out = resampleFn(tone)[2000:-2000]
+    return 20.0 * np.log10(np.sqrt(np.mean(out * out)) / (0.5 / np.sqrt(2)) + 1e-12)
+
+
+def timeChunks(processFn, chunks, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for chunk in chunks:
+            processFn(chunk)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", default="44100,48000", help="comma-separated input sample rates")
+    parser.add_argument("--chunk_ms", default=250, type=int, help="chunk size the browser posts")
+    parser.add_argument("--seconds", default=30, type=int, help="audio length per run")
+    parser.add_argument("--repeats", default=5, type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for origSr in (int(r) for r in args.rates.split(",")):
+        audio = (0.1 * rng.standard_normal(origSr * args.seconds)).astype(np.float32)
+        step = origSr * args.chunk_ms // 1000
+        chunks = [audio[i : i + step] for i in range(0, audio.size, step)]
+
+        interpTime = timeChunks(lambda c: interpResample(c, origSr), chunks, args.repeats)
+        resampler = StreamingResampler(origSr)
+        polyTime = timeChunks(resampler.process, chunks, args.repeats)
+
+        print(f"{origSr} Hz, {len(chunks)} x {args.chunk_ms} ms chunks")
+        print(f"  np.interp : {interpTime * 1000:8.2f} ms total, {interpTime / args.seconds * 1000:.3f} ms per audio second")
+        print(f"  polyphase : {polyTime * 1000:8.2f} ms total, {polyTime / args.seconds * 1000:.3f} ms per audio second")
+        for toneHz in (9000.0, 12000.0):
+            interpDb = aliasLevelDb(lambda x: interpResample(x, origSr), origSr, toneHz)
+            polyDb = aliasLevelDb(lambda x: StreamingResampler(origSr).process(x), origSr, toneHz)
+            print(f"  {toneHz / 1000:.0f} kHz tone alias level: np.interp {interpDb:7.1f} dB | polyphase {polyDb:7.1f} dB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Replay recorded /api/speech/stream sessions against a running backend.
+
+Record traffic by starting the backend with SPEECH_RECORD_DIR set, then run
+from the repository root:
+    python src/replay_speech.py recordings/ --speed 1 --concurrency 8
+    python src/replay_speech.py recordings/ --speed 0 --url http://asr-host:5000/api
+
+Each session keeps its recorded pacing (scaled by --speed, 0 = back to back)
+and, like the browser, waits for one chunk's reply before sending the next.
+Reports request latency percentiles and a word diff wherever the replayed
+transcript differs from the one the server gave while recording.
+"""
+
+import argparse
+import asyncio
+import difflib
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.asr.recording import SUFFIX, read_recording  # noqa: E402
+
+
+def findRecordings(paths):
+    found = []
+    for path in map(Path, paths):
+        found.extend(sorted(path.glob(f"*{SUFFIX}")) if path.is_dir() else [path])
+    return found
+
+
+def sessionTranscript(replies) -> str:
+    # the text of every closed utterance, plus whatever was still open at the end
+    texts, current = [], ""
+    for text, isFinal in replies:
+        current = text
+        if isFinal:
+            texts.append(current)
+            current = ""
+    texts.append(current)
+    return " ".join(t for t in texts if t)
+
+
+def wordDiff(expected: str, actual: str) -> str:
+    a, b = expected.split(), actual.split()
+    out = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(a=a, b=b, autojunk=False).get_opcodes():
+        if op == "equal":
+            out.append(" ".join(a[i1:i2]))
+            continue
+        if i2 > i1:
+            out.append("[-" + " ".join(a[i1:i2]) + "-]")
+        if j2 > j1:
+            out.append("{+" + " ".join(b[j1:j2]) + "+}")
+    return " ".join(out)
+
+
+async def replaySession(client, path: Path, speed: float, semaphore):
+    recorded = list(read_recording(str(path)))
+    sessionId = f"replay-{uuid.uuid4().hex}"
+    replies = []
+    async with semaphore:
+        start = time.monotonic()
+        for chunk in recorded:
+            if speed > 0:
+                delay = start + chunk.offset / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            headers = {
+                "X-Session-Id": sessionId,
+                "X-Finalize": "true" if chunk.finalize else "false",
+                "Content-Type": chunk.content_type or "application/octet-stream",
+            }
+            if chunk.sample_rate:
+                headers["X-Sample-Rate"] = str(chunk.sample_rate)
+            sent = time.perf_counter()
+            resp = await client.post("/speech/stream", content=chunk.data, headers=headers)
+            latency = time.perf_counter() - sent
+            if resp.status_code != 200:
+                replies.append({"latency": latency, "final": chunk.finalize, "text": "", "error": resp.status_code})
+                continue
+            data = resp.json()
+            replies.append({"latency": latency, "final": bool(data.get("is_final")), "text": data.get("text", "")})
+    expected = sessionTranscript((c.text, c.is_final) for c in recorded)
+    actual = sessionTranscript((r["text"], r["final"]) for r in replies)
+    return replies, expected, actual
+
+
+def printPercentiles(label: str, latencies):
+    if not latencies:
+        return
+    ms = np.asarray(latencies) * 1000.0
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    print(f"{label:<10} n={ms.size:<6} p50 {p50:8.1f} ms | p90 {p90:8.1f} ms | p99 {p99:8.1f} ms | max {ms.max():8.1f} ms")
+
+
+async def run(args):
+    recordings = findRecordings(args.paths)
+    if not recordings:
+        sys.exit("no recordings found")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(replaySession(client, path, args.speed, semaphore) for path in recordings))
+        elapsed = time.perf_counter() - started
+
+    allReplies = [reply for replies, _, _ in results for reply in replies]
+    errors = sum(1 for reply in allReplies if "error" in reply)
+    print(f"{len(recordings)} sessions, {len(allReplies)} requests ({errors} failed) in {elapsed:.1f}s")
+    printPercentiles("all", [r["latency"] for r in allReplies])
+    printPercentiles("interim", [r["latency"] for r in allReplies if not r["final"]])
+    printPercentiles("final", [r["latency"] for r in allReplies if r["final"]])
+
+    changed = 0
+    for path, (_, expected, actual) in zip(recordings, results):
+        if expected.split() == actual.split():
+            continue
+        changed += 1
+        if args.diffs:
+            print(f"\n{path.name}:\n  {wordDiff(expected, actual)}")
+    print(f"\ntranscripts changed: {changed} of {len(recordings)} sessions")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="recording files or directories of them")
+    parser.add_argument("--url", default="http://localhost:5000/api", help="backend API base")
+    parser.add_argument("--speed", default=1.0, type=float, help="pacing multiplier; 0 sends chunks back to back")
+    parser.add_argument("--concurrency", default=4, type=int, help="sessions replayed at once")
+    parser.add_argument("--timeout", default=60.0, type=float, help="per-request timeout in seconds")
+    parser.add_argument("--no-diffs", dest="diffs", action="store_false", help="only count changed transcripts")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
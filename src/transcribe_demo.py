@@ -2,6 +2,7 @@
 
 import argparse
 import os
+import sys
 import numpy as np
 import speech_recognition as sr
 import whisper
@@ -12,6 +13,10 @@ from datetime import datetime, timedelta
 from queue import Queue
 from time import sleep
 from sys import platform
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from backend.asr.resample import StreamingResampler  # noqa: E402
 
 
 def getMicDeviceIndexByName(targetName: str) -> int:
@@ -39,18 +44,6 @@ def getDeviceInfoByIndex(index: int):
     return info
 
 
-def resampleTo16k(x: np.ndarray, origSr: int) -> np.ndarray:
-    if origSr == 16000:
-        return x.astype(np.float32)
-    newLen = int(round(len(x) * 16000.0 / float(origSr)))
-    # linear interpolation resample (fast and good enough for ASR)
-    return np.interp(
-        np.linspace(0.0, 1.0, num=newLen, endpoint=False),
-        np.linspace(0.0, 1.0, num=len(x), endpoint=False),
-        x.astype(np.float32),
-    ).astype(np.float32)
-
-
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", default="large-v2", help="Model to use",
@@ -110,7 +103,9 @@ def main():
     # shared state
     dataQueue: Queue = Queue()
     transcription = [""]  # list of lines
-    phraseBytes = bytes()
+    phraseAudio = np.zeros(0, dtype=np.float32)
+    # polyphase resampler; keeps filter state across chunks of a phrase
+    resampler = StreamingResampler(micSampleRate)
     lastPhraseTime = None
 
     # callback collects raw bytes
@@ -137,7 +132,14 @@ def main():
                 if not dataQueue.empty():
                     phraseComplete = False
                     if lastPhraseTime and now - lastPhraseTime > timedelta(seconds=phraseTimeout):
-                        phraseBytes = bytes()
+                        # the filter still holds the last few ms of the finished phrase
+                        tail = resampler.flush()
+                        if tail.size and phraseAudio.size:
+                            phraseAudio = np.concatenate((phraseAudio, tail))
+                            result = audioModel.transcribe(phraseAudio, fp16=torch.cuda.is_available())
+                            transcription[-1] = result.get("text", "").strip()
+                        phraseAudio = np.zeros(0, dtype=np.float32)
+                        resampler = StreamingResampler(micSampleRate)
                         phraseComplete = True
                     lastPhraseTime = now
 
@@ -146,12 +148,10 @@ def main():
                     while not dataQueue.empty():
                         chunkList.append(dataQueue.get())
                     if chunkList:
-                        phraseBytes += b"".join(chunkList)
-
-                    # convert to float32 waveform in [-1, 1]
-                    audioNp = np.frombuffer(phraseBytes, dtype=np.int16).astype(np.float32) / 32768.0
-                    # resample to 16k for Whisper
-                    audioNp = resampleTo16k(audioNp, micSampleRate)
+                        # convert to float32 waveform in [-1, 1] and resample only the new audio to 16k
+                        chunkNp = np.frombuffer(b"".join(chunkList), dtype=np.int16).astype(np.float32) / 32768.0
+                        phraseAudio = np.concatenate((phraseAudio, resampler.process(chunkNp)))
+                    audioNp = phraseAudio
 
                     # transcribe
                     result = audioModel.transcribe(audioNp, fp16=torch.cuda.is_available())
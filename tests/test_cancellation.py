@@ -0,0 +1,51 @@
+import asyncio
+
+import numpy as np
+
+from backend.cancellation import TurnRegistry, turns
+from backend.routers import speech
+
+
+def test_device_cancels_turns_of_any_session():
+    registry = TurnRegistry()
+    token = registry.open("conversation-7", supersede=True, device_id="kiosk-lobby")
+
+    assert registry.cancel_device("conversation-7") == 0
+    assert registry.cancel_device("kiosk-lobby", "barge-in") == 1
+    assert token.reason == "barge-in"
+    # Cancelling by session afterwards finds nothing left to cancel.
+    assert registry.cancel("conversation-7") == 0
+
+
+def test_close_forgets_both_keys():
+    registry = TurnRegistry()
+    token = registry.open("conversation-7", device_id="kiosk-lobby")
+    registry.close("conversation-7", token)
+
+    assert registry.cancel_device("kiosk-lobby") == 0
+    assert not registry.active("conversation-7")
+    assert not token.cancelled
+
+
+def test_speech_barge_in_with_distinct_session_and_device(monkeypatch):
+    async def no_decode(job):
+        return []
+
+    monkeypatch.setattr(speech, "_transcribe_audio", no_decode)
+    monkeypatch.setattr(speech, "VAD_ENABLED", True)
+    token = turns.open("conversation-7", supersede=True, device_id="kiosk-lobby")
+    session = speech.SessionState(device_id="kiosk-lobby")
+    rng = np.random.default_rng(0)
+    try:
+        for _ in range(3):
+            quiet = (0.003 * rng.standard_normal(8000)).astype(np.float32)
+            asyncio.run(speech._process_audio(session, quiet, 16000, False))
+        assert not token.cancelled
+
+        voice = (0.3 * np.sin(2 * np.pi * 220 * np.arange(8000) / 16000)).astype(np.float32)
+        result = asyncio.run(speech._process_audio(session, voice, 16000, False))
+    finally:
+        turns.close("conversation-7", token)
+
+    assert result["barge_in"]
+    assert token.reason == "barge-in"
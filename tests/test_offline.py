@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+
+from backend.asr.decoding import Segment
+from backend.asr.offline import SAMPLE_RATE, pack_chunks, transcribe_chunk
+
+WORD_SECONDS = 0.8
+GAP_SECONDS = 0.2
+# The fake decoder runs out of tokens after this much of a window.
+TOKEN_CAP_SECONDS = 20.0
+
+
+def spoken_words(count: int) -> np.ndarray:
+    # Word k is a block of constant level (k + 1) / 1000, with a short pause after it.
+    word, gap = int(WORD_SECONDS * SAMPLE_RATE), int(GAP_SECONDS * SAMPLE_RATE)
+    audio = np.zeros(count * (word + gap), dtype=np.float32)
+    for k in range(count):
+        audio[k * (word + gap) : k * (word + gap) + word] = (k + 1) / 1000
+    return audio
+
+
+async def fake_decode(window: np.ndarray):
+    """Closed segments for whole words within the token budget, then one unfinished segment."""
+    levels = np.round(window * 1000).astype(int)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], levels, [0]))) != 0)
+    segments = []
+    for onset, offset in zip(edges[:-1], edges[1:]):
+        level = levels[onset]
+        if level == 0:
+            continue
+        start, end = onset / SAMPLE_RATE, offset / SAMPLE_RATE
+        if offset == window.size or end > TOKEN_CAP_SECONDS:
+            rest = " ".join(f"w{k}" for k in sorted(set(levels[onset:])) if k)
+            segments.append(Segment(start, window.size / SAMPLE_RATE, rest, complete=False))
+            break
+        segments.append(Segment(start, end, f"w{level}"))
+    return segments
+
+
+def test_speech_across_the_window_edge_is_decoded_again():
+    audio = spoken_words(45)
+    chunks = pack_chunks([(0, audio.size)])
+    assert chunks == [(0, audio.size)]
+
+    segments = asyncio.run(transcribe_chunk(fake_decode, audio, 0, audio.size))
+
+    assert [seg.text for seg in segments] == [f"w{k}" for k in range(1, 46)]
+    assert all(seg.complete for seg in segments)
+    starts = np.array([seg.start for seg in segments])
+    np.testing.assert_allclose(starts, np.arange(45) * (WORD_SECONDS + GAP_SECONDS), atol=1e-3)
+
+
+def test_short_regions_share_a_window():
+    second = SAMPLE_RATE
+    assert pack_chunks([(0, 5 * second), (8 * second, 20 * second), (25 * second, 40 * second)]) == [
+        (0, 20 * second),
+        (25 * second, 40 * second),
+    ]
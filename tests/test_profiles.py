@@ -0,0 +1,31 @@
+import pytest
+
+from backend.asr.profiles import ProfileSelector
+
+
+def test_estimate_scales_with_window_length():
+    selector = ProfileSelector()
+    for window in (2.0, 10.0, 4.0, 8.0, 6.0):
+        selector.observe("final", 0.1 + 0.05 * window, window)
+
+    assert selector.estimate("final", 2.0) == pytest.approx(0.2)
+    assert selector.estimate("final", 20.0) == pytest.approx(1.1)
+    assert selector.estimate("final", 20.0, queued_batches=1) == pytest.approx(2.2)
+
+
+def test_single_window_length_is_taken_as_proportional():
+    selector = ProfileSelector()
+    selector.observe("streaming", 0.3, 3.0)
+
+    assert selector.estimate("streaming", 6.0) == pytest.approx(0.6)
+    assert selector.estimate("partial", 6.0) is None
+
+
+def test_choose_downgrades_long_windows_only():
+    selector = ProfileSelector()
+    for window in (2.0, 8.0):
+        selector.observe("final", 0.1 * window, window)
+        selector.observe("streaming", 0.02 * window, window)
+
+    assert selector.choose("final", 0.5, window_seconds=3.0) == "final"
+    assert selector.choose("final", 0.5, window_seconds=8.0) == "streaming"
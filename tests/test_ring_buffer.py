@@ -0,0 +1,33 @@
+import numpy as np
+
+from backend.asr.ring_buffer import MIN_ALLOCATION, AudioRingBuffer
+
+
+def test_storage_grows_with_the_audio():
+    buffer = AudioRingBuffer(8 * MIN_ALLOCATION)
+    assert buffer.nbytes == 0
+
+    samples = np.arange(3 * MIN_ALLOCATION, dtype=np.float32)
+    buffer.append(samples[:100])
+    assert buffer.nbytes == 2 * MIN_ALLOCATION * 4
+    early = buffer.view()
+
+    buffer.append(samples[100:])
+    assert buffer.nbytes == 2 * 3 * MIN_ALLOCATION * 4
+    np.testing.assert_array_equal(buffer.view(), samples)
+    np.testing.assert_array_equal(early, samples[:100])
+
+
+def test_full_buffer_drops_oldest_across_the_wrap():
+    capacity = MIN_ALLOCATION + 10
+    buffer = AudioRingBuffer(capacity)
+    samples = np.arange(3 * capacity, dtype=np.float32)
+
+    buffer.append(samples[:capacity])
+    buffer.consume(7)
+    assert buffer.append(samples[capacity : 2 * capacity]) == capacity - 7
+    assert buffer.nbytes == 2 * capacity * 4
+    np.testing.assert_array_equal(buffer.view(), samples[capacity : 2 * capacity])
+
+    buffer.keep_last(5)
+    np.testing.assert_array_equal(buffer.view(), samples[2 * capacity - 5 : 2 * capacity])
@@ -0,0 +1,57 @@
+import numpy as np
+import torch
+from whisper.model import ModelDimensions, Whisper
+
+from backend.asr.decoding import SAMPLE_RATE, DecodeJob, _job_mel
+from backend.asr.features import N_FRAMES
+from backend.asr.worker_pool import SLOT_SAMPLES, AsrWorkerPool, _slot_job
+
+
+def tiny_whisper(n_mels: int) -> Whisper:
+    dims = ModelDimensions(
+        n_mels=n_mels,
+        n_audio_ctx=1500,
+        n_audio_state=64,
+        n_audio_head=2,
+        n_audio_layer=1,
+        n_vocab=51865,
+        n_text_ctx=448,
+        n_text_state=64,
+        n_text_head=2,
+        n_text_layer=1,
+    )
+    return Whisper(dims).eval()
+
+
+def shipped_job(model_name: str, job: DecodeJob) -> DecodeJob:
+    # What a worker reconstructs from the slot run_batch filled, without spawning one.
+    pool = AsrWorkerPool(1, model_name, "cpu", max_batch=1, core_sets=[set()])
+    pool._slab = np.zeros((1, SLOT_SAMPLES), dtype=np.float32)
+    _, *entry = pool._write_slot(0, job)
+    return _slot_job(pool._slab[0], *entry)
+
+
+def session_job(n_mels: int) -> DecodeJob:
+    audio = 0.01 * np.random.default_rng(0).standard_normal(2 * SAMPLE_RATE).astype(np.float32)
+    mel = np.zeros((n_mels, N_FRAMES), dtype=np.float32)
+    return DecodeJob(audio, "önceki metin", mel=mel, profile="final")
+
+
+def test_mismatched_cascade_ships_audio():
+    # base (80 bins) decodes interim chunks, large-v3 (128 bins) runs in the workers.
+    job = shipped_job("large-v3", session_job(80))
+
+    assert job.mel is None
+    assert job.audio.size == 2 * SAMPLE_RATE
+    assert job.prompt == "önceki metin" and job.profile == "final"
+    with torch.no_grad():
+        assert _job_mel(tiny_whisper(128), job).shape == (128, N_FRAMES)
+
+
+def test_matching_mel_is_shipped():
+    job = shipped_job("base", session_job(80))
+
+    assert job.mel is not None and job.mel.shape == (80, N_FRAMES)
+    assert job.audio.size == 0
+    assert job.seconds == 2.0
+    assert _job_mel(tiny_whisper(80), job).shape == (80, N_FRAMES)